@@ -0,0 +1,90 @@
+"""
+Peak memory of a deep chain of boolean operations.
+
+A box is drilled by ``--depth`` cylinders, each cut using the result of the
+previous one as its base. The chain is evaluated once with the document's
+copy-free operators, and once copying both operands with
+``BRepBuilderAPI_Copy`` before each cut, as the reconstruction used to do.
+Each run happens in a fresh process so that its peak RSS can be compared.
+
+Usage::
+
+    python benchmarks/bench_boolean_memory.py --depth 200
+"""
+
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+
+
+def _build_document(depth: int):
+    from jupytercad_lab.notebook.cad_document import CadDocument
+
+    doc = CadDocument()
+    doc.shape_cache = None
+    doc.add_box(name="base", length=depth + 2, width=4, height=4)
+    base = "base"
+    for i in range(depth):
+        doc.add_cylinder(
+            name=f"drill {i}", radius=0.3, height=6, position=[i + 1, 2, -1]
+        )
+        doc.cut(name=f"cut {i}", base=base, tool=f"drill {i}")
+        base = f"cut {i}"
+    return doc, base
+
+
+def _run(mode: str, depth: int, queue) -> None:
+    from jupytercad_lab.notebook import operators
+
+    if mode == "copy":
+        from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Copy
+
+        run_boolean = operators._run_boolean
+
+        def copying_boolean(algo_class, arguments, tools, options):
+            return run_boolean(
+                algo_class,
+                [BRepBuilderAPI_Copy(shape).Shape() for shape in arguments],
+                [BRepBuilderAPI_Copy(shape).Shape() for shape in tools],
+                options,
+            )
+
+        operators._run_boolean = copying_boolean
+
+    doc, last = _build_document(depth)
+    start = time.perf_counter()
+    shapes = doc._get_occ_shapes([last])
+    elapsed = time.perf_counter() - start
+    assert last in shapes
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+    queue.put((elapsed, peak))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--depth", type=int, default=100, help="number of chained cuts")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for mode in ("copy", "copy-free"):
+        queue = context.Queue()
+        process = context.Process(target=_run, args=(mode, args.depth, queue))
+        process.start()
+        results[mode] = queue.get()
+        process.join()
+
+    print(f"{'mode':<10} {'time (s)':>10} {'peak RSS (MiB)':>16}")
+    for mode, (elapsed, peak) in results.items():
+        print(f"{mode:<10} {elapsed:>10.2f} {peak / 1024:>16.1f}")
+    saved = 1 - results["copy-free"][1] / results["copy"][1]
+    print(f"peak RSS reduction: {saved:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Reconstruction and meshing time with OpenCascade's internal parallelism.
+
+Each model is reconstructed and meshed once with the serial engine and once
+with parallel booleans and parallel meshing enabled. Runs happen in fresh
+processes with the shape cache disabled, so that both start cold.
+
+Usage::
+
+    python benchmarks/bench_parallel_engine.py examples/v6_engine.jcad --threads 8
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+
+
+def _run(path: str, parallel: bool, threads, queue) -> None:
+    from jupytercad_lab.notebook.cad_document import CadDocument
+    from jupytercad_lab.notebook.operators import EngineOptions, mesh_shape
+
+    doc = CadDocument.import_from_file(path)
+    doc.shape_cache = None
+    doc.engine_options = EngineOptions(
+        parallel_booleans=parallel, parallel_meshing=parallel, threads=threads
+    )
+    names = [
+        name
+        for name in doc.topological_order()
+        if (view := doc.get_object_view(name)) is not None and view.visible
+    ]
+    if not names:
+        raise ValueError(f"{path} has no visible objects to reconstruct")
+
+    start = time.perf_counter()
+    shapes = doc._get_occ_shapes(names)
+    reconstructed = time.perf_counter()
+    for shape in shapes.values():
+        mesh_shape(shape, 0.01, doc.engine_options)
+    meshed = time.perf_counter()
+    queue.put((reconstructed - start, meshed - reconstructed))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("models", nargs="+", help="jcad files to reconstruct")
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=os.cpu_count(),
+        help="threads of the parallel runs",
+    )
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(
+        f"{'model':<24} {'serial (s)':>12} {'parallel (s)':>14} "
+        f"{'booleans':>10} {'meshing':>10}"
+    )
+    for path in args.models:
+        results = {}
+        for parallel in (False, True):
+            queue = context.Queue()
+            process = context.Process(
+                target=_run, args=(path, parallel, args.threads, queue)
+            )
+            process.start()
+            results[parallel] = queue.get()
+            process.join()
+        serial, parallel = results[False], results[True]
+        print(
+            f"{os.path.basename(path):<24} {sum(serial):>12.2f} {sum(parallel):>14.2f} "
+            f"{serial[0] / max(parallel[0], 1e-9):>9.2f}x "
+            f"{serial[1] / max(parallel[1], 1e-9):>9.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,50 @@ import os
 import sys
 import json
 import logging
-import tempfile
+import operator
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
-import math
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 
-from pycrdt import Array, Doc, Map, Text
-from pydantic import BaseModel
+from pycrdt import Array, ArrayEvent, Doc, Map, MapEvent, Text
+from pydantic import BaseModel, TypeAdapter, ValidationError
 from ypywidgets.comm import CommWidget
 
 from uuid import uuid4
 from .converter import generate_model_thumbnail
+from .gltf_compression import GlbCompression, compress_glb
+from .jcad_reader import JcadReader, read_value_at
+from .operators import (
+    DEFAULT_ENGINE_OPTIONS,
+    EngineOptions,
+    MeshQuality,
+    apply_refine,
+    applies_placement,
+    build_shape,
+    copy_shape,
+    get_mesh_quality,
+    has_operator,
+    mesh_shape_adaptive,
+    place_shape,
+    shape_to_brep,
+)
+from .scheduler import build_shapes_in_processes, mesh_shapes_in_processes
+from .shape_cache import ShapeCache, default_shape_cache, shape_key
 
 from jupytercad_core.schema import (
     IBox,
@@ -36,16 +69,20 @@ from jupytercad_core.schema import (
 )
 from jupytercad_core.schema.interfaces import geomLineSegment, geomCircle
 
+if TYPE_CHECKING:
+    from numpy.typing import ArrayLike
+
 logger = logging.getLogger(__file__)
 if logger.hasHandlers():
     logger.handlers.clear()
 
 handler = logging.StreamHandler(sys.stdout)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 logger.setLevel(logging.INFO)
 
+
 class CadDocument(CommWidget):
     """
     Create a new CadDocument object.
@@ -70,48 +107,313 @@ class CadDocument(CommWidget):
         self.ydoc["outputs"] = self._outputs = Map()
         self.ydoc["options"] = self._options = Map()
 
+        # Name index mirroring the order of ``_objects_array``, kept in sync
+        # by an observer so that lookups by name do not scan the array.
+        # ``_object_maps`` holds the map handles in the same order, indexing
+        # into a yrs array walks it from the start.
+        self._object_names: List[str] = []
+        self._object_maps: List[Map] = []
+        self._name_index: Dict[str, int] = {}
+        # Highest "<type> <n>" suffix seen per type, used to generate names.
+        self._name_counters: Dict[str, int] = {}
+        # Decoded objects by name, entries are dropped when their map changes.
+        self._object_cache: Dict[str, JcadObjectView] = {}
+        self._object_cache_hits = 0
+        self._object_cache_misses = 0
+        # Dependency graph between objects (Base, Tool and Shapes references).
+        # Edges of objects in ``_stale_dependencies`` are re-read on next use.
+        self._dependencies: Dict[str, List[str]] = {}
+        self._dependents: Dict[str, Set[str]] = {}
+        self._stale_dependencies: Set[str] = set()
+        # Embedded file contents left on disk by ``import_from_file``. An
+        # entry applies while the object's ``Content`` parameter is empty.
+        self._deferred_content: Dict[str, _DeferredContent] = {}
+        # Reconstructed shapes by content hash, and the hashes of the objects.
+        # A hash depends on the dependencies, so any change drops them all.
+        # The cache holds shapes before their placement, under a hash that
+        # leaves the placement out, so moving an object reuses its geometry.
+        self._shape_cache: Optional[ShapeCache] = default_shape_cache()
+        self._shape_keys: Dict[str, str] = {}
+        self._cache_keys: Dict[str, str] = {}
+        # Shapes evaluated for this document. A modified object is marked
+        # dirty, and its shape and the ones built from it are dropped the
+        # next time shapes are needed, so only that branch is recomputed.
+        self._evaluated_shapes: Dict[str, Any] = {}
+        self._dirty_shapes: Set[str] = set()
+        # The ``Refine`` pass is only run on the shapes handed out by
+        # ``export``, ``bake`` and feature extraction, not on intermediates.
+        self._refined_shapes: Dict[str, Any] = {}
+        self._max_workers = 1
+        self._engine_options: Optional[EngineOptions] = None
+        self._objects_subscription = self._objects_array.observe_deep(
+            self._on_objects_change
+        )
+        self._batch: Optional[_Batch] = None
+
     @property
     def objects(self) -> List[str]:
         """
         Get the list of objects that the document contains as a list of strings.
         """
-        if self._objects_array:
-            return [x["name"] for x in self._objects_array]
-        return []
+        return list(self._object_names)
+
+    @contextmanager
+    def batch(self) -> Iterator[CadDocument]:
+        """
+        Group several edits into a single transaction.
+
+        All the mutations done inside the ``with`` block are sent to the
+        frontend as one update. Duplicate names and references to missing
+        objects are only checked when the block exits, so an operand may be
+        referenced before it is created. If the block raises, or if that
+        validation fails, every edit of the batch is rolled back.
+
+        .. code-block:: Python
+
+            with doc.batch():
+                doc.add_box(name="b1").add_box(name="b2").cut()
+
+        Nested ``batch()`` blocks join the outermost one.
+        """
+        if self._batch is not None:
+            yield self
+            return
+
+        batch = self._batch = _Batch()
+        try:
+            with self.ydoc.transaction():
+                try:
+                    yield self
+                    self._commit_batch(batch)
+                except BaseException:
+                    self._rollback_batch(batch)
+                    raise
+        finally:
+            self._batch = None
+
+    def _commit_batch(self, batch: _Batch) -> None:
+        for name, value in batch.pending_visible.items():
+            obj = self._get_yobject_by_name(name)
+            if obj is None:
+                raise ValueError(f"No object named {name}")
+            self._set_yobject_item(obj, "visible", value)
+
+        # Only the names added by this batch: a document may already hold
+        # duplicates, e.g. from concurrent inserts by two collaborators.
+        duplicates = {
+            name for name in batch.collisions if self._object_names.count(name) > 1
+        }
+        if duplicates:
+            raise ValueError(f"Objects {sorted(duplicates)} already exist")
+
+        for name in batch.added:
+            obj = self._get_yobject_by_name(name)
+            if obj is None:
+                continue
+            for dependency in _get_dependencies(obj.get("parameters", {})):
+                if not self.check_exist(dependency):
+                    raise ValueError(
+                        f"Object {name} references unknown object {dependency}"
+                    )
+
+    def _rollback_batch(self, batch: _Batch) -> None:
+        batch.recording = False
+        for undo in reversed(batch.undo):
+            undo()
+        batch.undo.clear()
+
+    def _record_undo(self, undo: Callable[[], None]) -> None:
+        if self._batch is not None and self._batch.recording:
+            self._batch.undo.append(undo)
+
+    def _append_yobject(self, yobject: Map) -> None:
+        self._insert_yobject(len(self._object_names), yobject)
+
+    def _insert_yobject(self, index: int, yobject: Map) -> None:
+        self._objects_array.insert(index, yobject)
+        if self._batch is not None:
+            # Observers only run on commit, keep the index current meanwhile.
+            name = yobject["name"]
+            self._note_collisions([name])
+            self._splice_index(index, 0, [name], [yobject])
+            self._batch.added.append(name)
+            self._record_undo(lambda: self._pop_yobject(index))
+
+    def _extend_yobjects(self, yobjects: List[Map], names: List[str]) -> None:
+        start = len(self._object_names)
+        self._objects_array.extend(yobjects)
+        if self._batch is not None:
+            self._note_collisions(names)
+            self._splice_index(start, 0, names, yobjects)
+            self._batch.added.extend(names)
+
+            def undo():
+                for _ in names:
+                    self._pop_yobject(start)
+
+            self._record_undo(undo)
+
+    def _note_collisions(self, names: List[str]) -> None:
+        seen = set()
+        for name in names:
+            if name in self._name_index or name in seen:
+                self._batch.collisions.append(name)
+            seen.add(name)
+
+    def _pop_yobject(self, index: int) -> None:
+        if self._batch is None:
+            self._objects_array.pop(index)
+            return
+        data = self._object_maps[index].to_py()
+        self._objects_array.pop(index)
+        self._splice_index(index, 1, [], [])
+        self._record_undo(lambda: self._insert_yobject(index, Map(data)))
+
+    def _set_yobject_item(self, yobject: Map, key: str, value: Any) -> None:
+        if self._batch is not None:
+            missing = key not in yobject
+            old_value = yobject.get(key)
+            if key == "name":
+                self._rename_index_entry(self._name_index[old_value], value)
+            else:
+                self._invalidate_object(yobject["name"])
+
+            def undo():
+                if missing:
+                    del yobject[key]
+                else:
+                    self._set_yobject_item(yobject, key, old_value)
+
+            self._record_undo(undo)
+        yobject[key] = value
 
     @classmethod
-    def import_from_file(cls, path: str | Path) -> CadDocument:
+    def import_from_file(
+        cls,
+        path: str | Path,
+        progress: Optional[Callable[[int, int], None]] = None,
+        defer_content_above: Optional[int] = None,
+    ) -> CadDocument:
         """
         Import a CadDocument from a .jcad file.
 
+        The file is read incrementally, one object at a time, so the whole
+        file is never decoded in memory at once.
+
         :param path: The path to the file.
+        :param progress: Optional callback, called after each object with
+            the number of bytes read so far and the size of the file.
+        :param defer_content_above: If set, an embedded ``Content`` larger
+            than this many bytes is skipped over while reading the file,
+            without being decoded. It is read back from the file when the
+            object's parameters are accessed, which raises a RuntimeError
+            if the file was modified in the meantime.
+            Deferred objects are not rendered by the frontend until
+            :meth:`load_deferred_content` is called.
         :return: A new CadDocument instance.
         """
         instance = cls()
-        with open(path, "r") as f:
-            jcad_content = json.load(f)
+        # Deferred contents are only read back from this version of the file.
+        stat = os.stat(path)
+        with JcadReader(path) as reader, instance.ydoc.transaction():
+            for key in reader.keys():
+                if key == "objects":
+                    if defer_content_above is None:
+                        objects = reader.iter_array()
+                    else:
+                        objects = reader.iter_array(
+                            ("parameters", "Content"), defer_content_above
+                        )
+                    # Objects are added in bulk, about one chunk of the file
+                    # at a time, as appending them one by one is slower.
+                    pending: List[Map] = []
+                    pending_size = 0
+                    for raw in objects:
+                        obj = raw.decode()
+                        if raw.deferred is not None:
+                            instance._defer_content(obj, path, stat, *raw.deferred)
+                        pending.append(Map(obj))
+                        pending_size += len(raw.data)
+                        if pending_size >= reader.chunk_size:
+                            instance._objects_array.extend(pending)
+                            pending = []
+                            pending_size = 0
+                        if progress is not None:
+                            progress(reader.position, reader.size)
+                    instance._objects_array.extend(pending)
+                elif key == "options":
+                    instance._options.update(reader.read_value().decode())
+                elif key == "metadata":
+                    instance._metadata.update(reader.read_value().decode())
+                elif key == "outputs":
+                    instance._outputs.update(reader.read_value().decode())
+                else:
+                    reader.read_value()
+            if progress is not None:
+                progress(reader.size, reader.size)
 
-        instance.ydoc["objects"] = instance._objects_array = Array(
-            [Map(obj) for obj in jcad_content.get("objects", [])]
-        )
-        instance.ydoc["options"] = instance._options = Map(
-            jcad_content.get("options", {})
-        )
-        instance.ydoc["metadata"] = instance._metadata = Map(
-            jcad_content.get("metadata", {})
-        )
-        instance.ydoc["outputs"] = instance._outputs = Map(
-            jcad_content.get("outputs", {})
+        return instance
+
+    def load_deferred_content(
+        self, names: Optional[Iterable[str]] = None
+    ) -> CadDocument:
+        """
+        Load the contents left on disk by :meth:`import_from_file` into the document.
+
+        :param names: The objects to load, all of them by default.
+        """
+        names = list(self._deferred_content if names is None else names)
+        if not names:
+            # E.g. on every save of a document without deferred content.
+            return self
+        with self.batch():
+            for name in names:
+                yobject = self._get_yobject_by_name(name)
+                deferred = self._deferred_content.pop(name, None)
+                if yobject is None or deferred is None:
+                    continue
+                parameters = yobject["parameters"]
+                if parameters.get("Content") == "":
+                    parameters["Content"] = deferred.load()
+                    self._set_yobject_item(yobject, "parameters", parameters)
+        return self
+
+    def _defer_content(
+        self,
+        obj: Dict,
+        path: str | Path,
+        stat: os.stat_result,
+        offset: int,
+        length: int,
+    ) -> None:
+        self._deferred_content[obj["name"]] = _DeferredContent(
+            os.path.abspath(path), offset, length, stat.st_mtime_ns, stat.st_size
         )
 
-        return instance
+    def _get_deferred_content(
+        self, name: str, parameters: Dict
+    ) -> Optional[_DeferredContent]:
+        if parameters.get("Content") == "":
+            return self._deferred_content.get(name)
+
+    def _object_to_py(self, yobject: Map) -> Dict:
+        """
+        Convert an object to a dict, including its deferred content if any.
+        """
+        data = yobject.to_py()
+        parameters = data.get("parameters")
+        if self._deferred_content and isinstance(parameters, dict):
+            deferred = self._get_deferred_content(data.get("name"), parameters)
+            if deferred is not None:
+                parameters["Content"] = deferred.load()
+        return data
 
     def save(
         self,
         path: str | Path,
         extract_features: bool = True,
         extraction_level: str = "standard",
-        force_recompute: bool = False
+        force_recompute: bool = False,
     ) -> None:
         """
         Save the CadDocument to a .jcad file on the local filesystem.
@@ -126,13 +428,17 @@ class CadDocument(CommWidget):
         """
         # Extract features if requested
         if extract_features:
-            from .feature_extraction import FeatureExtractionService, ExtractionOptions, ExtractionLevel
+            from .feature_extraction import (
+                FeatureExtractionService,
+                ExtractionOptions,
+                ExtractionLevel,
+            )
 
             # Map string level to ExtractionLevel enum
             level_map = {
                 "full": ExtractionLevel.FULL,
                 "standard": ExtractionLevel.STANDARD,
-                "minimal": ExtractionLevel.MINIMAL
+                "minimal": ExtractionLevel.MINIMAL,
             }
             level = level_map.get(extraction_level, ExtractionLevel.STANDARD)
 
@@ -155,13 +461,24 @@ class CadDocument(CommWidget):
                         for key, value in obj_data.items():
                             obj_map[key] = value
 
-                        logger.info(f"Extracted {len(result.features)} features for {obj_name} using {result.extraction_method.value} method (level: {extraction_level})")
+                        logger.info(
+                            f"Extracted {len(result.features)} features for {obj_name} using {result.extraction_method.value} method (level: {extraction_level})"
+                        )
                 elif result.extraction_method.value == "error":
-                    logger.warning(f"Feature extraction failed for {obj_name}: {result.errors}")
-
+                    logger.warning(
+                        f"Feature extraction failed for {obj_name}: {result.errors}"
+                    )
+
+        # The file being overwritten may back deferred contents.
+        target = os.path.abspath(path)
+        self.load_deferred_content(
+            name
+            for name, deferred in self._deferred_content.items()
+            if deferred.path == target
+        )
         content = {
             "schemaVersion": SCHEMA_VERSION,
-            "objects": self._objects_array.to_py(),
+            "objects": [self._object_to_py(yobject) for yobject in self._objects_array],
             "options": self._options.to_py(),
             "metadata": self._metadata.to_py(),
             "outputs": self._outputs.to_py(),
@@ -169,213 +486,388 @@ class CadDocument(CommWidget):
         with open(path, "w") as f:
             json.dump(content, f, indent=4)
 
-    def export(self, path: str) -> None:
+    def export(
+        self,
+        path: str,
+        quality: str | MeshQuality = "normal",
+        lods: Optional[Sequence[str | MeshQuality]] = None,
+        compression: Optional[GlbCompression] = None,
+    ) -> None:
         """
         Export the visible objects in the document to a GLB file.
+
+        :param path: The path of the GLB file.
+        :param quality: The mesh quality, one of the presets ``"draft"``,
+            ``"normal"`` and ``"fine"``, or a :class:`operators.MeshQuality`.
+            Deflections are relative to the size of each shape, so small
+            parts get as many triangles as large ones.
+        :param lods: The mesh qualities of several levels of detail, from the
+            coarsest to the finest. If given, ``quality`` is ignored and one
+            GLB file per level, ``<name>.lod<i>.glb``, is written next to
+            ``path`` together with a ``<name>.lods.json`` manifest listing
+            them. The shapes are only reconstructed once for all levels.
+        :param compression: If given, the GLB files are post-processed to
+            quantize the vertex attributes and reorder the triangles, see
+            :class:`gltf_compression.GlbCompression`.
         """
+        qualities = [get_mesh_quality(level) for level in lods] if lods else []
+        quality = get_mesh_quality(quality)
         try:
-            from OCC.Core.TDocStd import TDocStd_Document
-            from OCC.Core.XCAFDoc import XCAFDoc_DocumentTool, XCAFDoc_ColorGen
-            from OCC.Core.RWGltf import RWGltf_CafWriter
-            from OCC.Core.TCollection import TCollection_ExtendedString, TCollection_AsciiString
-            from OCC.Core.Quantity import Quantity_Color as Quantities_Color, Quantity_TOC_RGB as Quantities_TOC_RGB
-            from OCC.Core.TColStd import TColStd_IndexedDataMapOfStringString
-            from OCC.Core.Message import Message_ProgressRange
-            # [重要修复] 引入 BRepMesh 用于生成网格
-            from OCC.Core.BRepMesh import BRepMesh_IncrementalMesh
+            from OCC.Core.TopLoc import TopLoc_Location
         except ImportError:
             logger.error("Export requires pythonocc-core to be installed.")
             return
 
+        # Reconstruct the visible shapes, operands are only rebuilt on cache misses
+        visible = [
+            name
+            for name in self.topological_order()
+            if (view := self.get_object_view(name)) is not None and view.visible
+        ]
+        created_shapes = self._get_occ_shapes(visible, refine=True)
+        shapes = {
+            name: created_shapes[name] for name in visible if created_shapes.get(name)
+        }
+        if not shapes:
+            logger.warning("No visible shapes to export.")
+            return
+
+        # Objects with the same geometry, e.g. repeated parts, are meshed once
+        # and written as instances of a single mesh.
+        instances = {name: self._instance_key(name) for name in shapes}
+        prototypes = {}
+        for name, shape in shapes.items():
+            if instances[name] not in prototypes:
+                prototypes[instances[name]] = shape.Located(TopLoc_Location())
+
+        thumbnail_path = (
+            os.path.splitext(path.replace("converted", "thumbnails"))[0] + ".png"
+        )
+        if not qualities:
+            # [重要修复] 生成网格 (Triangulation)，GLB 必须包含网格数据
+            # All the shapes are meshed before the single write pass.
+            meshed = self._mesh_occ_shapes(prototypes, quality)
+            self._write_glb(path, shapes, instances, meshed, compression)
+            generate_model_thumbnail(path, thumbnail_path)
+            return
+
+        stem = os.path.splitext(path)[0]
+        levels = []
+        for index, level in enumerate(qualities):
+            level_path = f"{stem}.lod{index}.glb"
+            meshed = self._mesh_occ_shapes(prototypes, level)
+            self._write_glb(level_path, shapes, instances, meshed, compression)
+            levels.append(
+                {
+                    "path": os.path.basename(level_path),
+                    "relativeDeflection": level.relative_deflection,
+                    "angularDeflection": level.angular_deflection,
+                    "size": os.path.getsize(level_path),
+                }
+            )
+        manifest_path = f"{stem}.lods.json"
+        with open(manifest_path, "w") as f:
+            json.dump({"objects": list(shapes), "levels": levels}, f, indent=4)
+        logger.info(
+            f"Successfully exported {len(levels)} levels of detail to {manifest_path}"
+        )
+        generate_model_thumbnail(f"{stem}.lod{len(levels) - 1}.glb", thumbnail_path)
+
+    def _instance_key(self, name: str) -> str:
+        """
+        Get a key shared by the objects whose shapes have the same geometry,
+        up to their placement.
+        """
+        key = self._shape_key(name)
+        if key is None:
+            return name
+        # Refining a placed shape may move its geometry out of its location.
+        if getattr(self.get_object_view(name).parameters, "Refine", False):
+            return key
+        return self._cache_keys[name]
+
+    def _write_glb(
+        self,
+        path: str,
+        shapes: Dict[str, Any],
+        instances: Dict[str, str],
+        meshed_prototypes: Dict[str, Any],
+        compression: Optional[GlbCompression] = None,
+    ) -> None:
+        """
+        Write shapes to a GLB file, with the colors of their objects.
+
+        Each object is a component of an assembly referencing the meshed
+        prototype of its instance key, so repeated parts share one glTF mesh.
+        """
+        from OCC.Core.TDocStd import TDocStd_Document
+        from OCC.Core.TDataStd import TDataStd_Name
+        from OCC.Core.XCAFDoc import XCAFDoc_DocumentTool, XCAFDoc_ColorGen
+        from OCC.Core.RWGltf import RWGltf_CafWriter
+        from OCC.Core.TCollection import (
+            TCollection_ExtendedString,
+            TCollection_AsciiString,
+        )
+        from OCC.Core.Quantity import (
+            Quantity_Color as Quantities_Color,
+            Quantity_TOC_RGB as Quantities_TOC_RGB,
+        )
+        from OCC.Core.TColStd import TColStd_IndexedDataMapOfStringString
+        from OCC.Core.Message import Message_ProgressRange
+
         doc = TDocStd_Document(TCollection_ExtendedString("JupyterCAD"))
         shape_tool = XCAFDoc_DocumentTool.ShapeTool(doc.Main())
         color_tool = XCAFDoc_DocumentTool.ColorTool(doc.Main())
-        
-        has_shape = False
-        created_shapes = {} # Cache for reconstructed shapes
-
-        # Reconstruct and add visible shapes
-        for name in self.objects:
-             obj = self.get_object(name)
-             if not obj: continue
-
-             # Reconstruct shape (needed for boolean ops even if hidden)
-             shape = self._reconstruct_occ_shape(obj, created_shapes)
-             
-             if shape:
-                 created_shapes[name] = shape
-                 
-                 # Only export if visible
-                 if obj.visible:
-                     # [重要修复] 生成网格 (Triangulation)，GLB 必须包含网格数据
-                     # 0.01 是线性偏差 (Linear Deflection)，越小越平滑
-                     mesh_gen = BRepMesh_IncrementalMesh(shape, 0.01)
-                     mesh_gen.Perform()
-
-                     # Add to XCAF Doc
-                     label = shape_tool.AddShape(shape, False)
-                     has_shape = True
-                     
-                     # Set Color
-                     if hasattr(obj, "parameters") and hasattr(obj.parameters, "Color"):
-                        hex_color = obj.parameters.Color 
-                        if hex_color and hex_color.startswith("#"):
-                            try:
-                                r = int(hex_color[1:3], 16) / 255.0
-                                g = int(hex_color[3:5], 16) / 255.0
-                                b = int(hex_color[5:7], 16) / 255.0
-                                col = Quantities_Color(r, g, b, Quantities_TOC_RGB)
-                                color_tool.SetColor(label, col, XCAFDoc_ColorGen)
-                            except ValueError:
-                                pass
-        
-        if has_shape:
-            writer = RWGltf_CafWriter(TCollection_AsciiString(path), True)
-            # Pass all required arguments for modern pythonocc
-            writer.Perform(doc, TColStd_IndexedDataMapOfStringString(), Message_ProgressRange())
-            logger.info(f"Successfully exported GLB to {path}")
-            
-            thumbnail_path = os.path.splitext(path.replace("converted", "thumbnails"))[0] + ".png"
-            generate_model_thumbnail(path, thumbnail_path)
+        assembly = shape_tool.NewShape()
+        prototype_labels = {}
+
+        for name, shape in shapes.items():
+            obj = self.get_object_view(name)
+            prototype = meshed_prototypes.get(instances[name])
+            if not prototype:
+                continue
+
+            # Add to XCAF Doc
+            prototype_label = prototype_labels.get(instances[name])
+            if prototype_label is None:
+                prototype_label = shape_tool.AddShape(prototype, False)
+                prototype_labels[instances[name]] = prototype_label
+            label = shape_tool.AddComponent(assembly, prototype_label, shape.Location())
+            TDataStd_Name.Set(label, TCollection_ExtendedString(name))
+
+            # Set Color
+            if hasattr(obj, "parameters") and hasattr(obj.parameters, "Color"):
+                hex_color = obj.parameters.Color
+                if hex_color and hex_color.startswith("#"):
+                    try:
+                        r = int(hex_color[1:3], 16) / 255.0
+                        g = int(hex_color[3:5], 16) / 255.0
+                        b = int(hex_color[5:7], 16) / 255.0
+                        col = Quantities_Color(r, g, b, Quantities_TOC_RGB)
+                        color_tool.SetColor(label, col, XCAFDoc_ColorGen)
+                    except ValueError:
+                        pass
+        shape_tool.UpdateAssemblies()
+
+        writer = RWGltf_CafWriter(TCollection_AsciiString(path), True)
+        # Pass all required arguments for modern pythonocc
+        writer.Perform(
+            doc, TColStd_IndexedDataMapOfStringString(), Message_ProgressRange()
+        )
+        if compression is not None:
+            compress_glb(path, compression)
+        logger.info(f"Successfully exported GLB to {path}")
+
+    def _mesh_occ_shapes(
+        self, shapes: Dict[str, Any], quality: MeshQuality
+    ) -> Dict[str, Any]:
+        """
+        Triangulate shapes for export.
+
+        Triangulated copies are returned, so that the shapes, which may be
+        held by the shape cache, are not modified. With more than one
+        worker, they are meshed in a pool of processes, otherwise one after
+        another.
+        """
+        if self._max_workers > 1 and len(shapes) > 1:
+            return mesh_shapes_in_processes(
+                shapes, quality, self._max_workers, self.engine_options
+            )
+        meshed = {}
+        for name, shape in shapes.items():
+            meshed[name] = copy_shape(shape)
+            mesh_shape_adaptive(meshed[name], quality, self.engine_options)
+        return meshed
+
+    def bake(
+        self, names: str | Sequence[str], keep_history: bool = False
+    ) -> CadDocument:
+        """
+        Replace objects by their evaluated geometry.
+
+        Each object is reconstructed once with OpenCascade and stored as a
+        ``Part::Any`` BRep object, keeping its name, position, visibility
+        and color. The hidden objects only used to build it are removed, so
+        the document no longer needs to evaluate that history when opened or
+        exported.
+
+        :param names: The name(s) of the objects to bake.
+        :param keep_history: Whether to save the replaced objects in the
+            document metadata, so that :meth:`restore_history` can bring the
+            parametric history back.
+        """
+        try:
+            from OCC.Core.BRepTools import breptools  # noqa: F401
+        except ImportError:
+            raise RuntimeError(
+                "Baking objects requires pythonocc-core to be installed."
+            )
+
+        names = [names] if isinstance(names, str) else list(names)
+        for name in names:
+            if not self.check_exist(name):
+                raise ValueError(f"Unknown object {name}")
+
+        shapes = self._get_occ_shapes(names, refine=True)
+        for name in names:
+            if name not in shapes:
+                raise RuntimeError(f"Could not reconstruct the shape of {name}")
+
+        # An intermediate object goes away with the baked objects if it is
+        # hidden and everything built from it goes away too. Walking in
+        # reverse topological order sees the dependents first.
+        baked = set(names)
+        removed = set()
+        history = self.topological_order(
+            [dep for name in names for dep in self.dependencies(name, transitive=True)]
+        )
+        for name in reversed(history):
+            if name in baked or self.get_object_view(name).visible:
+                continue
+            if all(d in baked or d in removed for d in self.dependents(name)):
+                removed.add(name)
+
+        with self.batch():
+            for name in names:
+                yobject = self._get_yobject_by_name(name)
+                if keep_history:
+                    saved = [
+                        self._object_to_py(self._get_yobject_by_name(dep))
+                        for dep in self.dependencies(name, transitive=True)
+                        if dep in removed
+                    ]
+                    saved.append(self._object_to_py(yobject))
+                    self._set_metadata(f"history_{name}", json.dumps(saved))
+
+                parameters = yobject.get("parameters", {})
+                self._set_yobject_item(yobject, "shape", Parts.Part__Any.value)
+                self._set_yobject_item(
+                    yobject,
+                    "parameters",
+                    {
+                        "Content": shape_to_brep(shapes[name]),
+                        "Type": "brep",
+                        "Color": parameters.get("Color", "#808080"),
+                        # The placement is already applied to the geometry.
+                        "Placement": {
+                            "Position": [0, 0, 0],
+                            "Axis": [0, 0, 1],
+                            "Angle": 0,
+                        },
+                    },
+                )
+                if "dependencies" in yobject:
+                    self._set_yobject_item(yobject, "dependencies", [])
+
+            for name in reversed(self.topological_order(removed)):
+                self._pop_yobject(self._get_yobject_index_by_name(name))
+
+        return self
+
+    def restore_history(self, name: str) -> CadDocument:
+        """
+        Bring back the parametric history of an object baked with ``keep_history=True``.
+        """
+        key = f"history_{name}"
+        if key not in self._metadata:
+            raise ValueError(f"No history saved for {name}")
+        *intermediates, original = json.loads(self._metadata[key])
+        for data in intermediates:
+            if self.check_exist(data["name"]):
+                raise ValueError(f"Object {data['name']} already exists")
+
+        with self.batch():
+            index = self._get_yobject_index_by_name(name)
+            yobject = self._get_yobject_by_name(name)
+            for item_key, value in original.items():
+                self._set_yobject_item(yobject, item_key, value)
+            for data in reversed(intermediates):
+                self._insert_yobject(index, Map(data))
+            self._set_metadata(key, None)
+
+        return self
+
+    def _set_metadata(self, key: str, value: Optional[str]) -> None:
+        """
+        Set or, when ``value`` is None, delete a metadata entry.
+        """
+        old_value = self._metadata.get(key)
+        if value is None:
+            self._metadata.pop(key)
         else:
-            logger.warning("No visible shapes to export.")
+            self._metadata[key] = value
 
-    def _reconstruct_occ_shape(self, obj, existing_shapes) -> Optional[Any]:
+        def undo():
+            if old_value is None:
+                self._metadata.pop(key)
+            else:
+                self._metadata[key] = old_value
+
+        self._record_undo(undo)
+
+    def _reconstruct_occ_shape(
+        self, obj, existing_shapes, refine: bool = False
+    ) -> Optional[Any]:
         """
         Reconstruct the OpenCascade TopoDS_Shape for a given object.
+
+        The shapes of the document's objects are looked up in, and added to,
+        the shape cache. The ``Refine`` parameter is only honoured if
+        ``refine`` is True, for shapes that are not used as operands.
         """
+        name = getattr(obj, "name", None)
+        # Only a view obtained from this document is known to match its state.
+        if self._object_cache.get(name) is not obj:
+            shape = self._build_occ_shape(obj, existing_shapes, self.engine_options)
+            if shape and refine and getattr(obj.parameters, "Refine", False):
+                shape = apply_refine(shape)
+            return shape
+
+        self._flush_dirty_shapes()
+        shape = self._evaluated_shapes.get(name)
+        if shape is None:
+            shape = self._get_cached_shape(name)
+        if shape is None:
+            shape = self._build_and_cache(name, obj, existing_shapes)
+        if shape:
+            self._evaluated_shapes[name] = shape
+            if refine:
+                shape = self._refine_occ_shape(name, shape)
+        return shape
+
+    @staticmethod
+    def _build_occ_shape(
+        obj,
+        existing_shapes,
+        options: Optional[EngineOptions] = None,
+        placed: bool = True,
+    ) -> Optional[Any]:
+        # Resolve shape type enum to string
+        shape_type = obj.shape.value if hasattr(obj.shape, "value") else str(obj.shape)
+        if not has_operator(shape_type):
+            logger.warning(
+                f"Cannot reconstruct {obj.name}: {shape_type} is not supported"
+            )
+            return None
         try:
-            from OCC.Core.BRepPrimAPI import (
-                BRepPrimAPI_MakeBox,
-                BRepPrimAPI_MakeCylinder,
-                BRepPrimAPI_MakeSphere,
-                BRepPrimAPI_MakeCone,
-                BRepPrimAPI_MakeTorus,
+            return build_shape(
+                shape_type, obj.parameters, existing_shapes, options, placed
             )
-            from OCC.Core.BRepAlgoAPI import BRepAlgoAPI_Cut, BRepAlgoAPI_Fuse, BRepAlgoAPI_Common
-            from OCC.Core.gp import gp_Pnt, gp_Vec, gp_Dir, gp_Ax2, gp_Trsf, gp_Ax1
-            from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Transform, BRepBuilderAPI_Copy
-            from OCC.Core.ShapeUpgrade import ShapeUpgrade_UnifySameDomain
         except ImportError:
             logger.error("Reconstruction requires pythonocc-core.")
-            return None
-        
-        # Helper: Apply Refine (UnifySameDomain)
-        def apply_refine(shape):
-            unif = ShapeUpgrade_UnifySameDomain(shape, True, True, False)
-            unif.Build()
-            return unif.Shape()
-
-        # Helper: Apply Placement (Position, Rotation)
-        def apply_placement(shape, placement):
-            if shape is None: return None
-            
-            pos = placement.Position # [x, y, z]
-            axis = placement.Axis    # [x, y, z]
-            angle = placement.Angle  # degrees
-            
-            trsf = gp_Trsf()
-            
-            # 1. Rotation (around Origin)
-            if axis and (axis[0] != 0 or axis[1] != 0 or axis[2] != 0):
-                 occ_axis = gp_Ax1(gp_Pnt(0,0,0), gp_Dir(axis[0], axis[1], axis[2]))
-                 trsf.SetRotation(occ_axis, math.radians(angle))
-            
-            # 2. Translation (Move the rotated shape to position)
-            if pos:
-                trsf.SetTranslationPart(gp_Vec(pos[0], pos[1], pos[2]))
-            
-            return BRepBuilderAPI_Transform(shape, trsf, True).Shape()
+        except Exception as e:
+            logger.error(f"Error reconstructing object {obj.name} ({shape_type}): {e}")
+        return None
 
-        # Resolve shape type enum to string
+    @staticmethod
+    def _place_occ_shape(obj, shape) -> Optional[Any]:
         shape_type = obj.shape.value if hasattr(obj.shape, "value") else str(obj.shape)
-        params = obj.parameters
-        occ_shape = None
-
         try:
-            if shape_type == "Part::Box":
-                occ_shape = BRepPrimAPI_MakeBox(params.Length, params.Width, params.Height).Shape()
-
-            elif shape_type == "Part::Cylinder":
-                occ_shape = BRepPrimAPI_MakeCylinder(params.Radius, params.Height, math.radians(params.Angle)).Shape()
-            
-            elif shape_type == "Part::Sphere":
-                occ_shape = BRepPrimAPI_MakeSphere(params.Radius, math.radians(params.Angle3)).Shape()
-
-            elif shape_type == "Part::Cone":
-                occ_shape = BRepPrimAPI_MakeCone(params.Radius1, params.Radius2, params.Height, math.radians(params.Angle)).Shape()
-                
-            elif shape_type == "Part::Torus":
-                occ_shape = BRepPrimAPI_MakeTorus(params.Radius1, params.Radius2, math.radians(params.Angle3)).Shape()
-
-            elif shape_type == "Part::Cut":
-                base = existing_shapes.get(params.Base)
-                tool = existing_shapes.get(params.Tool)
-                
-                if base and tool:
-                    # 使用 BRepBuilderAPI_Copy 复制形状，避免修改原始数据
-                    base_copy = BRepBuilderAPI_Copy(base).Shape()
-                    tool_copy = BRepBuilderAPI_Copy(tool).Shape()
-                    
-                    algo = BRepAlgoAPI_Cut(base_copy, tool_copy)
-                    # [关键修复] 设置模糊容差，解决重合面切割失败的问题
-                    algo.SetFuzzyValue(1.e-6) 
-                    algo.Build()
-                    
-                    if algo.IsDone():
-                        occ_shape = algo.Shape()
-                        if hasattr(params, "Refine") and params.Refine:
-                            occ_shape = apply_refine(occ_shape)
-                    else:
-                        logger.warning(f"Cut operation failed for {obj.name}")
-
-            elif shape_type == "Part::MultiFuse":
-                shapes_list = params.Shapes
-                valid_shapes = [existing_shapes.get(s) for s in shapes_list if existing_shapes.get(s)]
-                
-                if len(valid_shapes) >= 2:
-                    current_shape = BRepBuilderAPI_Copy(valid_shapes[0]).Shape()
-                    
-                    for i in range(1, len(valid_shapes)):
-                        next_shape = BRepBuilderAPI_Copy(valid_shapes[i]).Shape()
-                        algo = BRepAlgoAPI_Fuse(current_shape, next_shape)
-                        algo.SetFuzzyValue(1.e-6)
-                        algo.Build()
-                        if algo.IsDone():
-                            current_shape = algo.Shape()
-                    
-                    occ_shape = current_shape
-                    if hasattr(params, "Refine") and params.Refine:
-                        occ_shape = apply_refine(occ_shape)
-
-            elif shape_type == "Part::MultiCommon":
-                shapes_list = params.Shapes
-                valid_shapes = [existing_shapes.get(s) for s in shapes_list if existing_shapes.get(s)]
-                
-                if len(valid_shapes) >= 2:
-                    current_shape = BRepBuilderAPI_Copy(valid_shapes[0]).Shape()
-                    for i in range(1, len(valid_shapes)):
-                        next_shape = BRepBuilderAPI_Copy(valid_shapes[i]).Shape()
-                        algo = BRepAlgoAPI_Common(current_shape, next_shape)
-                        algo.SetFuzzyValue(1.e-6)
-                        algo.Build()
-                        if algo.IsDone():
-                            current_shape = algo.Shape()
-                    
-                    occ_shape = current_shape
-                    if hasattr(params, "Refine") and params.Refine:
-                        occ_shape = apply_refine(occ_shape)
-
+            return place_shape(shape_type, obj.parameters, shape)
         except Exception as e:
-            logger.error(f"Error reconstructing object {obj.name} ({shape_type}): {e}")
-            return None
-        
-        # Finally, apply the placement
-        if occ_shape and hasattr(params, 'Placement'):
-            occ_shape = apply_placement(occ_shape, params.Placement)
-            
-        return occ_shape
-    
+            logger.error(f"Error placing object {obj.name} ({shape_type}): {e}")
+        return None
+
     @classmethod
     def _path_to_comm(cls, filePath: Optional[str]) -> Dict:
         path = None
@@ -402,38 +894,547 @@ class CadDocument(CommWidget):
         )
 
     def get_object(self, name: str) -> Optional["PythonJcadObject"]:
-        if self.check_exist(name):
-            data = self._get_yobject_by_name(name).to_py()
-            return OBJECT_FACTORY.create_object(data, self)
+        view = self.get_object_view(name)
+        if view is not None:
+            return view.to_object(self)
+
+    def get_object_view(self, name: str) -> Optional["JcadObjectView"]:
+        """
+        Get a read-only view on an object.
+
+        Unlike :meth:`get_object`, the object is not converted to a pydantic
+        model up front: its parameters are only decoded when accessed.
+        Views are cached per name until the object is modified, so repeated
+        reads decode the parameters only once.
+        """
+        view = self._object_cache.get(name)
+        if view is not None:
+            self._object_cache_hits += 1
+            return view
+
+        self._object_cache_misses += 1
+        yobject = self._get_yobject_by_name(name)
+        if yobject is not None and OBJECT_FACTORY.has_factory(yobject.get("shape")):
+            deferred = None
+            if self._deferred_content:
+                deferred = self._get_deferred_content(
+                    name, yobject.get("parameters", {})
+                )
+            view = self._object_cache[name] = JcadObjectView(yobject, deferred)
+            return view
+
+    def object_cache_info(self) -> ObjectCacheInfo:
+        """
+        Get the hit and miss counts of the decoded object cache.
+        """
+        return ObjectCacheInfo(
+            self._object_cache_hits,
+            self._object_cache_misses,
+            len(self._object_cache),
+        )
+
+    def _invalidate_object(self, name: str) -> None:
+        self._object_cache.pop(name, None)
+        self._stale_dependencies.add(name)
+        self._dirty_shapes.add(name)
+
+    def _flush_dirty_shapes(self) -> None:
+        if not self._dirty_shapes:
+            return
+        self._refresh_dependencies()
+        # One walk from all the edited objects, visiting shared dependents once.
+        stale = self._dirty_shapes
+        self._dirty_shapes = set()
+        queue = list(stale)
+        while queue:
+            for dependent in self._dependents.get(queue.pop(), ()):
+                if dependent not in stale:
+                    stale.add(dependent)
+                    queue.append(dependent)
+        for name in stale:
+            self._evaluated_shapes.pop(name, None)
+            self._refined_shapes.pop(name, None)
+            self._shape_keys.pop(name, None)
+            self._cache_keys.pop(name, None)
+
+    @property
+    def shape_cache(self) -> Optional[ShapeCache]:
+        """
+        The cache of reconstructed OpenCascade shapes used by :meth:`export`,
+        :meth:`save` and :meth:`bake`.
+
+        Shapes are keyed by the parameters of the objects and of the objects
+        they are built from, so unchanged parts of an assembly are not
+        reconstructed again, even in another session when the cache has a
+        directory. Set it to ``None`` to disable caching.
+        """
+        return self._shape_cache
+
+    @shape_cache.setter
+    def shape_cache(self, cache: Optional[ShapeCache]) -> None:
+        self._shape_cache = cache
+
+    @property
+    def max_workers(self) -> int:
+        """
+        The number of processes used to reconstruct independent objects, and
+        to mesh the exported shapes, in parallel. With the default of 1,
+        objects are reconstructed and meshed in this process, one after
+        another.
+        """
+        return self._max_workers
+
+    @max_workers.setter
+    def max_workers(self, value: int) -> None:
+        if value < 1:
+            raise ValueError("max_workers must be at least 1")
+        self._max_workers = value
+
+    @property
+    def engine_options(self) -> EngineOptions:
+        """
+        The options of the OpenCascade operators used to reconstruct shapes.
+
+        Unless set for this document, the module-wide
+        ``operators.DEFAULT_ENGINE_OPTIONS`` are used.
+        """
+        return self._engine_options or DEFAULT_ENGINE_OPTIONS
+
+    @engine_options.setter
+    def engine_options(self, options: Optional[EngineOptions]) -> None:
+        self._engine_options = options
+        # Some options change the resulting shapes, and so their keys.
+        self._shape_keys.clear()
+        self._cache_keys.clear()
+        self._evaluated_shapes.clear()
+        self._refined_shapes.clear()
+
+    def _shape_key(self, name: str) -> Optional[str]:
+        self._flush_dirty_shapes()
+        key = self._shape_keys.get(name)
+        if key is not None:
+            return key
+        try:
+            order = self.topological_order([name])
+        except ValueError:
+            return None
+        for item in order:
+            if item in self._shape_keys:
+                continue
+            yobject = self._get_yobject_by_name(item)
+            parameters = yobject.get("parameters", {})
+            deferred = self._get_deferred_content(item, parameters)
+            if deferred is not None:
+                parameters = dict(parameters, Content=deferred.load())
+            dependency_keys = [
+                self._shape_keys.get(dependency, f"missing:{dependency}")
+                for dependency in self._dependencies.get(item, ())
+            ]
+            shape_type = yobject.get("shape")
+            options = self.engine_options
+            self._shape_keys[item] = shape_key(
+                shape_type, parameters, dependency_keys, options
+            )
+            if applies_placement(shape_type) and "Placement" in parameters:
+                parameters = dict(parameters)
+                del parameters["Placement"]
+                self._cache_keys[item] = shape_key(
+                    shape_type, parameters, dependency_keys, options
+                )
+            else:
+                self._cache_keys[item] = self._shape_keys[item]
+        return self._shape_keys[name]
+
+    def _get_cached_shape(self, name: str) -> Optional[Any]:
+        """
+        Get the placed shape of an object from the shape cache, or None.
+        """
+        if self._shape_cache is None or self._shape_key(name) is None:
+            return None
+        shape = self._shape_cache.get(self._cache_keys[name])
+        if shape is None:
+            return None
+        return self._place_occ_shape(self.get_object_view(name), shape)
+
+    def _build_and_cache(
+        self,
+        name: str,
+        obj,
+        existing_shapes,
+        prototypes: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Any]:
+        """
+        Build the shape of an object and store it in the shape cache.
+
+        :param prototypes: The shapes built so far before their placement, by
+            cache key. Objects only differing by their placement reuse them.
+        """
+        key = self._cache_keys.get(name) if self._shape_key(name) is not None else None
+        shape = (
+            prototypes.get(key) if prototypes is not None and key is not None else None
+        )
+        if shape is None:
+            shape = self._build_occ_shape(
+                obj, existing_shapes, self.engine_options, placed=False
+            )
+            if not shape:
+                return None
+            if key is not None and prototypes is not None:
+                prototypes[key] = shape
+            if key is not None and self._shape_cache is not None:
+                self._shape_cache.put(key, shape)
+        return self._place_occ_shape(obj, shape)
+
+    def _refine_occ_shape(self, name: str, shape: Any) -> Any:
+        """
+        Apply the ``Refine`` parameter of an object to its evaluated shape.
+
+        Refined shapes are cached under the key of the shape they refine.
+        """
+        if not getattr(self.get_object_view(name).parameters, "Refine", False):
+            return shape
+        refined = self._refined_shapes.get(name)
+        if refined is not None:
+            return refined
+        key = self._shape_key(name) if self._shape_cache is not None else None
+        if key is not None:
+            key = shape_key("Refine", {}, [key])
+            refined = self._shape_cache.get(key)
+        if refined is None:
+            try:
+                refined = apply_refine(shape)
+            except Exception as e:
+                logger.error(f"Error refining object {name}: {e}")
+                return shape
+            if key is not None:
+                self._shape_cache.put(key, refined)
+        self._refined_shapes[name] = refined
+        return refined
+
+    def _get_occ_shapes(
+        self, names: Iterable[str], refine: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Get the OpenCascade shapes of objects, from the shape cache if possible.
+
+        The objects an object is built from are only reconstructed if that
+        object is not in the cache. Shapes evaluated by a previous call are
+        reused until the object, or one it is built from, is modified.
+
+        :param names: The objects to get.
+        :param refine: Whether to apply the ``Refine`` parameter of these
+            objects. The objects they are built from are never refined.
+        """
+        self._flush_dirty_shapes()
+        names = list(names)
+        shapes = {}
+        visited = set()
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name in shapes or name in visited or not self.check_exist(name):
+                continue
+            visited.add(name)
+            shape = self._evaluated_shapes.get(name)
+            if shape is None:
+                shape = self._get_cached_shape(name)
+            if shape is not None:
+                shapes[name] = self._evaluated_shapes[name] = shape
+            else:
+                stack.extend(self.dependencies(name))
+
+        missing = [
+            name
+            for name in self.topological_order(
+                name for name in visited if name not in shapes
+            )
+            if name not in shapes and self.get_object_view(name) is not None
+        ]
+        if self._max_workers > 1 and len(missing) > 1:
+            built = build_shapes_in_processes(
+                {
+                    name: self._object_to_py(self._get_yobject_by_name(name))
+                    for name in missing
+                },
+                {name: self._dependencies.get(name, []) for name in missing},
+                shapes,
+                self._max_workers,
+                self.engine_options,
+            )
+            for name, shape in built.items():
+                if self._shape_cache is not None and self._shape_key(name) is not None:
+                    self._shape_cache.put(self._cache_keys[name], shape)
+                shape = self._place_occ_shape(self.get_object_view(name), shape)
+                if shape:
+                    shapes[name] = self._evaluated_shapes[name] = shape
+        else:
+            prototypes = {}
+            for name in missing:
+                shape = self._build_and_cache(
+                    name, self.get_object_view(name), shapes, prototypes
+                )
+                if shape:
+                    shapes[name] = self._evaluated_shapes[name] = shape
+
+        if refine:
+            for name in names:
+                if name in shapes:
+                    shapes[name] = self._refine_occ_shape(name, shapes[name])
+        return shapes
+
+    def dependencies(self, name: str, transitive: bool = False) -> List[str]:
+        """
+        Get the names of the objects an object is built from.
+
+        :param name: The object name.
+        :param transitive: Whether to also include the dependencies of the dependencies.
+        :return: The names, in document order. References to objects that do
+            not exist are included.
+        """
+        self._refresh_dependencies()
+        return self._walk_graph(name, self._dependencies, transitive)
+
+    def dependents(self, name: str, transitive: bool = False) -> List[str]:
+        """
+        Get the names of the objects built from an object.
+
+        :param name: The object name.
+        :param transitive: Whether to also include the dependents of the dependents.
+        :return: The names, in document order.
+        """
+        self._refresh_dependencies()
+        return self._walk_graph(name, self._dependents, transitive)
+
+    def topological_order(self, names: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        Get object names ordered so that every object comes after its dependencies.
+
+        :param names: The objects to order, all of them by default. Their
+            dependencies are included in the result even if not listed.
+        :return: The names, following the document order where possible.
+        """
+        self._refresh_dependencies()
+        order = []
+        # 1 while an object is on the stack, 2 once it has been emitted.
+        state: Dict[str, int] = {}
+        for root in self._object_names if names is None else names:
+            if root in state:
+                continue
+            if not self.check_exist(root):
+                raise ValueError(f"Unknown object {root}")
+            state[root] = 1
+            stack = [(root, iter(self._dependencies.get(root, ())))]
+            while stack:
+                node, remaining = stack[-1]
+                for dependency in remaining:
+                    if not self.check_exist(dependency):
+                        continue
+                    dependency_state = state.get(dependency)
+                    if dependency_state is None:
+                        state[dependency] = 1
+                        stack.append(
+                            (dependency, iter(self._dependencies.get(dependency, ())))
+                        )
+                        break
+                    if dependency_state == 1:
+                        path = [item for item, _ in stack]
+                        cycle = path[path.index(dependency) :] + [dependency]
+                        raise ValueError(f"Dependency cycle: {' -> '.join(cycle)}")
+                else:
+                    stack.pop()
+                    state[node] = 2
+                    order.append(node)
+        return order
+
+    def dangling_references(self) -> Dict[str, List[str]]:
+        """
+        Find references to objects that do not exist.
+
+        :return: A dict mapping object names to the missing names they reference.
+        """
+        self._refresh_dependencies()
+        dangling = {}
+        for name in self._object_names:
+            missing = [
+                dep
+                for dep in self._dependencies.get(name, ())
+                if not self.check_exist(dep)
+            ]
+            if missing:
+                dangling[name] = missing
+        return dangling
+
+    def _refresh_dependencies(self) -> None:
+        for name in self._stale_dependencies:
+            for dependency in self._dependencies.pop(name, ()):
+                dependents = self._dependents.get(dependency)
+                if dependents is not None:
+                    dependents.discard(name)
+                    if not dependents:
+                        del self._dependents[dependency]
+
+            yobject = self._get_yobject_by_name(name)
+            if yobject is None or yobject.get("shape") not in _OPERATOR_SHAPES:
+                continue
+            dependencies = _get_dependencies(yobject.get("parameters", {}))
+            self._dependencies[name] = dependencies
+            for dependency in dependencies:
+                self._dependents.setdefault(dependency, set()).add(name)
+        self._stale_dependencies.clear()
+
+    def _walk_graph(
+        self, name: str, edges: Dict[str, Iterable[str]], transitive: bool
+    ) -> List[str]:
+        found = dict.fromkeys(edges.get(name, ()))
+        if transitive:
+            queue = list(found)
+            while queue:
+                for item in edges.get(queue.pop(), ()):
+                    if item not in found and item != name:
+                        found[item] = None
+                        queue.append(item)
+        position = len(self._object_names)
+        return sorted(found, key=lambda item: self._name_index.get(item, position))
 
     def _get_color(self, shape_id: str | int) -> str:
-        shape = self.get_object(shape_id)
+        shape = self.get_object_view(shape_id)
         if hasattr(shape, "parameters") and hasattr(shape.parameters, "Color"):
             color = shape.parameters.Color
             return color
         else:
             return "#808080"
 
-    def remove(self, name: str) -> CadDocument:
-        index = self._get_yobject_index_by_name(name)
-        if self._objects_array and index != -1:
-            self._objects_array.pop(index)
+    def remove(self, name: str, cascade: bool = False) -> CadDocument:
+        """
+        Remove an object from the document.
+
+        :param name: The object name.
+        :param cascade: Also remove the objects built from it and make the
+            objects it was built from visible again, as the JupyterCAD app
+            does once the removal is confirmed. Otherwise the objects built
+            from it are left with a dangling reference.
+        """
+        if not self.check_exist(name):
+            return self
+
+        if not cascade:
+            dependents = self.dependents(name)
+            if dependents:
+                logger.warning(
+                    f"Removing {name}, which {', '.join(dependents)} still reference"
+                )
+            self._pop_yobject(self._get_yobject_index_by_name(name))
+            return self
+
+        with self.batch():
+            for dependency in self.dependencies(name):
+                if self.check_exist(dependency):
+                    self.set_visible(dependency, True)
+            for dependent in reversed(self.dependents(name, transitive=True)):
+                self._pop_yobject(self._get_yobject_index_by_name(dependent))
+            self._pop_yobject(self._get_yobject_index_by_name(name))
         return self
 
     def rename(self, old_name: str, new_name: str) -> CadDocument:
+        """
+        Rename an object in place.
+
+        The references to the object in the parameters of the objects built
+        from it, in annotations and in outputs are updated in the same
+        transaction.
+        """
         if new_name == old_name:
             return self
-        new_obj = self.get_object(old_name)
-        new_obj.name = new_name
-        self.add_object(new_obj).remove(old_name)
+        yobject = self._get_yobject_by_name(old_name)
+        if yobject is None:
+            raise ValueError(f"Unknown object {old_name}")
+        if self.check_exist(new_name):
+            raise ValueError(f"Object {new_name} already exists")
+
+        # The geometry does not change, so the decoded objects are carried
+        # over rather than decoded again.
+        view = self._object_cache.pop(old_name, None)
+        dependent_views = {}
+
+        with self.batch():
+            dependents = self.dependents(old_name)
+            self._set_yobject_item(yobject, "name", new_name)
+
+            for dependent in dependents:
+                dependent_object = self._get_yobject_by_name(dependent)
+                parameters = dependent_object["parameters"]
+                changes = _rename_references(parameters, old_name, new_name)
+                parameters.update(changes)
+                dependent_view = self._object_cache.get(dependent)
+                self._set_yobject_item(dependent_object, "parameters", parameters)
+                if "dependencies" in dependent_object:
+                    self._set_yobject_item(
+                        dependent_object,
+                        "dependencies",
+                        _get_dependencies(parameters),
+                    )
+                if (
+                    dependent_view is not None
+                    and dependent_view._parameters is not None
+                ):
+                    dependent_views[dependent] = (
+                        dependent_object,
+                        dependent_view,
+                        changes,
+                    )
+
+            self._rename_annotation_parent(old_name, new_name)
+            if old_name in self._outputs:
+                output = self._outputs.pop(old_name)
+                self._outputs[new_name] = output
+
+                def undo():
+                    self._outputs.pop(new_name)
+                    self._outputs[old_name] = output
+
+                self._record_undo(undo)
+
+        # Only once the rename is committed, or undone with an enclosing batch.
+        if view is not None:
+            self._object_cache[new_name] = view
+        for dependent, (
+            dependent_object,
+            dependent_view,
+            changes,
+        ) in dependent_views.items():
+            new_view = JcadObjectView(dependent_object)
+            new_view._parameters = dependent_view._parameters.model_copy(update=changes)
+            self._object_cache[dependent] = new_view
+
+        def undo():
+            for name in [new_name, *dependent_views]:
+                self._object_cache.pop(name, None)
+
+        self._record_undo(undo)
         return self
 
+    def _rename_annotation_parent(self, old_name: str, new_name: str) -> None:
+        for key, value in list(self._metadata.items()):
+            if not key.startswith("annotation_"):
+                continue
+            annotation = json.loads(value)
+            if annotation.get("parent") != old_name:
+                continue
+            annotation["parent"] = new_name
+            self._set_metadata(key, json.dumps(annotation))
+
     def add_object(self, new_object: "PythonJcadObject") -> CadDocument:
-        if self._objects_array is not None and not self.check_exist(new_object.name):
+        # Inside a batch, duplicate names are reported when it is committed.
+        if self._objects_array is not None and (
+            self._batch is not None or not self.check_exist(new_object.name)
+        ):
             obj_dict = json.loads(new_object.model_dump_json())
             obj_dict["visible"] = True
-            new_map = Map(obj_dict)
-            self._objects_array.append(new_map)
+            # Read by the app, e.g. to find what else to remove with an object.
+            dependencies = _get_dependencies(obj_dict["parameters"])
+            if dependencies:
+                obj_dict["dependencies"] = dependencies
+            self._append_yobject(Map(obj_dict))
         else:
             logger.error(f"Object {new_object.name} already exists")
         return self
@@ -447,7 +1448,7 @@ class CadDocument(CommWidget):
         user: Optional[Dict] = None,
     ) -> Optional[str]:
         new_id = f"annotation_${uuid4()}"
-        parent_obj = self.get_object(parent)
+        parent_obj = self.get_object_view(parent)
         if parent_obj is None:
             raise ValueError("Parent object not found")
 
@@ -459,18 +1460,21 @@ class CadDocument(CommWidget):
             )
         contents = [{"user": user, "value": message}]
         if self._metadata is not None:
-            self._metadata[new_id] = json.dumps(
-                {
-                    "position": position,
-                    "contents": contents,
-                    "parent": parent,
-                }
+            self._set_metadata(
+                new_id,
+                json.dumps(
+                    {
+                        "position": position,
+                        "contents": contents,
+                        "parent": parent,
+                    }
+                ),
             )
             return new_id
 
     def remove_annotation(self, annotation_id: str) -> None:
         if self._metadata is not None:
-            del self._metadata[annotation_id]
+            self._set_metadata(annotation_id, None)
 
     def add_step_file(
         self,
@@ -493,7 +1497,7 @@ class CadDocument(CommWidget):
             "name": shape_name,
             "parameters": {
                 "Content": data,
-                "Type": "STEP",
+                "Type": "step",
                 "Placement": {
                     "Position": position,
                     "Axis": rotation_axis,
@@ -503,7 +1507,7 @@ class CadDocument(CommWidget):
             "visible": True,
         }
 
-        self._objects_array.append(Map(data))
+        self._append_yobject(Map(data))
 
         return self
 
@@ -515,19 +1519,15 @@ class CadDocument(CommWidget):
         rotation_axis: List[float] = [0, 0, 1],
         rotation_angle: float = 0,
     ) -> CadDocument:
-        try:
-            from OCC.Core.BRepTools import breptools
-        except ImportError:
-            raise RuntimeError("Cannot add an OpenCascade shape if it's not installed.")
-
         shape_name = name if name else self._new_name("OCCShape")
         if self.check_exist(shape_name):
             logger.error(f"Object {shape_name} already exists")
             return
 
-        with tempfile.NamedTemporaryFile() as tmp:
-            breptools.Write(shape, tmp.name, True, False, 1)
-            brepdata = tmp.read().decode("ascii")
+        try:
+            brepdata = shape_to_brep(shape)
+        except ImportError:
+            raise RuntimeError("Cannot add an OpenCascade shape if it's not installed.")
 
         data = {
             "shape": "Part::Any",
@@ -544,7 +1544,7 @@ class CadDocument(CommWidget):
             "visible": True,
         }
 
-        self._objects_array.append(Map(data))
+        self._append_yobject(Map(data))
 
         return self
 
@@ -696,6 +1696,210 @@ class CadDocument(CommWidget):
         }
         return self.add_object(OBJECT_FACTORY.create_object(data, self))
 
+    def add_boxes(
+        self,
+        lengths: ArrayLike = 1,
+        widths: ArrayLike = 1,
+        heights: ArrayLike = 1,
+        colors: str | Sequence[str] = "#808080",
+        positions: ArrayLike = (0, 0, 0),
+        rotation_axes: ArrayLike = (0, 0, 1),
+        rotation_angles: ArrayLike = 0,
+        names: Optional[Sequence[str]] = None,
+    ) -> CadDocument:
+        """
+        Add many boxes in one go.
+
+        Each argument is either a single value shared by all the boxes or an
+        array with one entry per box: shape ``(N,)`` for scalars and colors,
+        ``(N, 3)`` for positions and rotation axes. The values are checked
+        against the bounds of the schema with NumPy instead of building a
+        pydantic model per box, and all the boxes are inserted in a single
+        transaction.
+
+        :param names: The names of the boxes, generated if not provided.
+        """
+        return self._add_primitives(
+            Parts.Part__Box.value,
+            "Box",
+            IBox,
+            {"Length": lengths, "Width": widths, "Height": heights},
+            colors=colors,
+            positions=positions,
+            rotation_axes=rotation_axes,
+            rotation_angles=rotation_angles,
+            names=names,
+        )
+
+    def add_cylinders(
+        self,
+        radii: ArrayLike = 1,
+        heights: ArrayLike = 1,
+        angles: ArrayLike = 360,
+        colors: str | Sequence[str] = "#808080",
+        positions: ArrayLike = (0, 0, 0),
+        rotation_axes: ArrayLike = (0, 0, 1),
+        rotation_angles: ArrayLike = 0,
+        names: Optional[Sequence[str]] = None,
+    ) -> CadDocument:
+        """
+        Add many cylinders in one go.
+
+        The arguments follow the same broadcasting rules as :meth:`add_boxes`.
+        """
+        return self._add_primitives(
+            Parts.Part__Cylinder.value,
+            "Cylinder",
+            ICylinder,
+            {"Radius": radii, "Height": heights, "Angle": angles},
+            colors=colors,
+            positions=positions,
+            rotation_axes=rotation_axes,
+            rotation_angles=rotation_angles,
+            names=names,
+        )
+
+    def add_spheres(
+        self,
+        radii: ArrayLike = 5,
+        angles1: ArrayLike = -90,
+        angles2: ArrayLike = 90,
+        angles3: ArrayLike = 360,
+        colors: str | Sequence[str] = "#808080",
+        positions: ArrayLike = (0, 0, 0),
+        rotation_axes: ArrayLike = (0, 0, 1),
+        rotation_angles: ArrayLike = 0,
+        names: Optional[Sequence[str]] = None,
+    ) -> CadDocument:
+        """
+        Add many spheres in one go.
+
+        The arguments follow the same broadcasting rules as :meth:`add_boxes`.
+        """
+        return self._add_primitives(
+            Parts.Part__Sphere.value,
+            "Sphere",
+            ISphere,
+            {"Radius": radii, "Angle1": angles1, "Angle2": angles2, "Angle3": angles3},
+            colors=colors,
+            positions=positions,
+            rotation_axes=rotation_axes,
+            rotation_angles=rotation_angles,
+            names=names,
+        )
+
+    def _add_primitives(
+        self,
+        shape_type: str,
+        obj_type: str,
+        model: Type[BaseModel],
+        parameters: Dict[str, ArrayLike],
+        *,
+        colors: str | Sequence[str],
+        positions: ArrayLike,
+        rotation_axes: ArrayLike,
+        rotation_angles: ArrayLike,
+        names: Optional[Sequence[str]],
+    ) -> CadDocument:
+        try:
+            import numpy as np
+        except ImportError:
+            raise RuntimeError("Adding objects in bulk requires numpy to be installed.")
+
+        scalars = {
+            key: np.asarray(value, dtype=float) for key, value in parameters.items()
+        }
+        angles = np.asarray(rotation_angles, dtype=float)
+        vectors = {
+            "Position": np.asarray(positions, dtype=float),
+            "Axis": np.asarray(rotation_axes, dtype=float),
+        }
+
+        shapes = [array.shape for array in scalars.values()] + [angles.shape]
+        for key, array in vectors.items():
+            if array.ndim not in (1, 2) or array.shape[-1] != 3:
+                raise ValueError(f"{key} must have shape (3,) or (N, 3)")
+            shapes.append(array.shape[:-1])
+        if not isinstance(colors, str):
+            colors = list(colors)
+            shapes.append((len(colors),))
+        if names is not None:
+            names = list(names)
+            shapes.append((len(names),))
+
+        try:
+            shape = np.broadcast_shapes(*shapes)
+        except ValueError:
+            raise ValueError("The arguments cannot be broadcast to a common length")
+        if len(shape) > 1:
+            raise ValueError("Scalar arguments must have shape (N,)")
+        count = shape[0] if shape else 1
+
+        for key, array in [*scalars.items(), *vectors.items(), ("Angle", angles)]:
+            if not np.isfinite(array).all():
+                raise ValueError(f"{key} must only contain finite values")
+        # The bounds of the schema, as enforced by pydantic for a single object.
+        for key, array in scalars.items():
+            values = np.broadcast_to(array, (count,))
+            for kind, bound in _field_bounds(model, key):
+                reject, description = _BOUND_CHECKS[kind]
+                invalid = np.flatnonzero(reject(values, bound))
+                if invalid.size:
+                    index = invalid[0]
+                    raise ValueError(
+                        f"{key} must be {description} {bound}, "
+                        f"got {values[index]} at index {index}"
+                    )
+
+        if isinstance(colors, str):
+            colors = [colors] * count
+        color_type = model.model_fields["Color"].annotation
+        try:
+            TypeAdapter(List[color_type]).validate_python(colors)
+        except ValidationError as e:
+            raise ValueError(f"Invalid colors: {e}") from None
+
+        if names is None:
+            names = self._new_names(obj_type, count)
+        elif len(set(names)) != len(names):
+            raise ValueError("Names must be unique")
+        elif any(self.check_exist(name) for name in names):
+            raise ValueError(
+                f"Object {next(n for n in names if self.check_exist(n))} already exists"
+            )
+
+        columns = {
+            key: np.broadcast_to(array, (count,)).tolist()
+            for key, array in scalars.items()
+        }
+        placement_angles = np.broadcast_to(angles, (count,)).tolist()
+        placement_positions = np.broadcast_to(vectors["Position"], (count, 3)).tolist()
+        placement_axes = np.broadcast_to(vectors["Axis"], (count, 3)).tolist()
+
+        yobjects = []
+        for i in range(count):
+            obj_parameters = {key: column[i] for key, column in columns.items()}
+            obj_parameters["Color"] = colors[i]
+            obj_parameters["Placement"] = {
+                "Position": placement_positions[i],
+                "Axis": placement_axes[i],
+                "Angle": placement_angles[i],
+            }
+            yobjects.append(
+                Map(
+                    {
+                        "shape": shape_type,
+                        "name": names[i],
+                        "parameters": obj_parameters,
+                        "metadata": None,
+                        "visible": True,
+                    }
+                )
+            )
+
+        self._extend_yobjects(yobjects, names)
+        return self
+
     def add_sketch(
         self,
         name: str = "",
@@ -941,17 +2145,18 @@ class CadDocument(CommWidget):
 
     def _get_operand(self, shape: str | int | None, default_idx: int = -1):
         if isinstance(shape, str):
-            if shape not in self.objects:
+            # Inside a batch, references are validated when it is committed.
+            if self._batch is None and not self.check_exist(shape):
                 raise ValueError(f"Unknown object {shape}")
         elif isinstance(shape, int):
-            shape = self.objects[shape]
+            shape = self._object_names[shape]
         else:
-            shape = self.objects[default_idx]
+            shape = self._object_names[default_idx]
 
         return shape
 
     def _get_boolean_operands(self, shape1: str | int | None, shape2: str | int | None):
-        if len(self.objects) < 2:
+        if len(self._object_names) < 2:
             raise ValueError(
                 "Cannot apply boolean operator if there are less than two objects in the document."  # noqa E501
             )
@@ -964,8 +2169,11 @@ class CadDocument(CommWidget):
     def set_visible(self, name: str, value):
         obj: Optional[Map] = self._get_yobject_by_name(name)
         if obj is None:
+            if self._batch is not None:
+                self._batch.pending_visible[name] = value
+                return
             raise RuntimeError(f"No object named {name}")
-        obj["visible"] = value
+        self._set_yobject_item(obj, "visible", value)
 
     def set_color(self, name: str, value: str):
         obj: Optional[Map] = self._get_yobject_by_name(name)
@@ -973,39 +2181,238 @@ class CadDocument(CommWidget):
             raise RuntimeError(f"No object named {name}")
         parameters = obj.get("parameters", {})
         parameters["Color"] = value
-        obj["parameters"] = parameters
+        self._set_yobject_item(obj, "parameters", parameters)
 
     def check_exist(self, name: str) -> bool:
-        if self.objects:
-            return name in self.objects
-        return False
+        return name in self._name_index
 
     def _get_yobject_by_name(self, name: str) -> Optional[Map]:
-        if self._objects_array:
-            for index, item in enumerate(self._objects_array):
-                if item["name"] == name:
-                    return self._objects_array[index]
-        return None
+        index = self._name_index.get(name)
+        if index is None:
+            return None
+        return self._object_maps[index]
 
     def _get_yobject_index_by_name(self, name: str) -> int:
-        if self._objects_array:
-            for index, item in enumerate(self._objects_array):
-                if item["name"] == name:
-                    return index
-        return -1
+        return self._name_index.get(name, -1)
+
+    def _on_objects_change(self, events) -> None:
+        """
+        Keep the name index in sync with ``_objects_array``.
+
+        Called for local and remote changes alike: insertions and deletions
+        in the array are replayed from the event delta, and renames are
+        picked up from changes of the ``name`` key of an object map.
+        Changes made inside a batch already updated the index eagerly.
+        """
+        if self._batch is not None:
+            return
+        for event in events:
+            if isinstance(event, ArrayEvent) and not event.path:
+                self._apply_objects_delta(event.delta)
+            elif event.path:
+                # A change inside an object map, possibly a rename.
+                position = event.path[0]
+                self._invalidate_object(self._object_names[position])
+                change = (
+                    event.keys.get("name")
+                    if isinstance(event, MapEvent) and len(event.path) == 1
+                    else None
+                )
+                if change is not None:
+                    self._rename_index_entry(position, change["newValue"])
+
+    def _apply_objects_delta(self, delta: List[Dict]) -> None:
+        position = 0
+        for op in delta:
+            if "retain" in op:
+                position += op["retain"]
+            elif "insert" in op:
+                yobjects = op["insert"]
+                names = [item["name"] for item in yobjects]
+                self._splice_index(position, 0, names, yobjects)
+                position += len(names)
+            elif "delete" in op:
+                self._splice_index(position, op["delete"], [], [])
+
+    def _splice_index(
+        self, start: int, deleted: int, names: List[str], yobjects: List[Map]
+    ) -> None:
+        index = self._name_index
+        for name in names:
+            self._update_name_counter(name)
+            self._invalidate_object(name)
+        for name in self._object_names[start : start + deleted]:
+            self._invalidate_object(name)
+        tail = self._object_names[start:]
+        if deleted == 0 and not tail:
+            # Appending, the common case for builder scripts: nothing shifts.
+            for offset, name in enumerate(names):
+                index.setdefault(name, start + offset)
+            self._object_names.extend(names)
+            self._object_maps.extend(yobjects)
+            return
+
+        for i, name in enumerate(tail, start):
+            if index.get(name) == i:
+                del index[name]
+        self._object_names[start : start + deleted] = names
+        self._object_maps[start : start + deleted] = yobjects
+        for i in range(start, len(self._object_names)):
+            index.setdefault(self._object_names[i], i)
+
+    def _rename_index_entry(self, position: int, new_name: str) -> None:
+        old_name = self._object_names[position]
+        self._object_names[position] = new_name
+        self._update_name_counter(new_name)
+        self._invalidate_object(old_name)
+        self._invalidate_object(new_name)
+        if old_name in self._deferred_content:
+            self._deferred_content[new_name] = self._deferred_content.pop(old_name)
+        if self._name_index.get(old_name) == position:
+            del self._name_index[old_name]
+            # A concurrent edit may have left a duplicate further down.
+            try:
+                self._name_index[old_name] = self._object_names.index(
+                    old_name, position + 1
+                )
+            except ValueError:
+                pass
+        current = self._name_index.get(new_name)
+        if current is None or current > position:
+            self._name_index[new_name] = position
+
+    def _update_name_counter(self, name: str) -> None:
+        obj_type, _, suffix = name.rpartition(" ")
+        if obj_type and suffix.isdecimal():
+            n = int(suffix)
+            if n > self._name_counters.get(obj_type, 0):
+                self._name_counters[obj_type] = n
+
+    def _new_names(self, obj_type: str, count: int) -> List[str]:
+        return [self._new_name(obj_type) for _ in range(count)]
 
     def _new_name(self, obj_type: str) -> str:
-        n = 1
-        name = f"{obj_type} 1"
-        objects = self.objects
+        # The counter is past every "<type> <n>" name the document has held,
+        # including remote ones, so the loop is only a safety net.
+        n = self._name_counters.get(obj_type, 0) + 1
+        name = f"{obj_type} {n}"
 
-        while name in objects:
-            name = f"{obj_type} {n}"
+        while self.check_exist(name):
             n += 1
+            name = f"{obj_type} {n}"
 
+        self._name_counters[obj_type] = n
         return name
 
 
+class ObjectCacheInfo(NamedTuple):
+    """
+    Statistics of the decoded object cache of a :class:`CadDocument`.
+    """
+
+    hits: int
+    misses: int
+    size: int
+
+
+class _DeferredContent(NamedTuple):
+    """
+    Location of a ``Content`` parameter that was not loaded, in a .jcad file.
+    """
+
+    path: str
+    offset: int
+    length: int
+    mtime_ns: int
+    size: int
+
+    def load(self) -> str:
+        stat = os.stat(self.path)
+        if (stat.st_mtime_ns, stat.st_size) != (self.mtime_ns, self.size):
+            raise RuntimeError(
+                f"{self.path} was modified since it was imported, "
+                "its deferred content can no longer be read"
+            )
+        return read_value_at(self.path, self.offset, self.length)
+
+
+class _Batch:
+    """
+    Book-keeping for an open :meth:`CadDocument.batch` block.
+    """
+
+    def __init__(self):
+        self.undo: List[Callable[[], None]] = []
+        self.recording = True
+        self.added: List[str] = []
+        # Added names that were already taken when they were added.
+        self.collisions: List[str] = []
+        self.pending_visible: Dict[str, bool] = {}
+
+
+# Shapes whose parameters reference other objects.
+_OPERATOR_SHAPES = {
+    Parts.Part__Cut.value,
+    Parts.Part__MultiFuse.value,
+    Parts.Part__MultiCommon.value,
+    Parts.Part__Extrusion.value,
+    Parts.Part__Chamfer.value,
+    Parts.Part__Fillet.value,
+}
+
+
+# For each bound of a pydantic field, the comparison finding the values
+# outside of it and how to describe it.
+_BOUND_CHECKS = {
+    "gt": (operator.le, "greater than"),
+    "ge": (operator.lt, "greater than or equal to"),
+    "lt": (operator.ge, "less than"),
+    "le": (operator.gt, "less than or equal to"),
+}
+
+
+def _field_bounds(model: Type[BaseModel], key: str) -> List[Tuple[str, float]]:
+    """
+    Get the numeric bounds of a field of a schema model, e.g. ``[("gt", 0)]``.
+    """
+    bounds = []
+    for constraint in model.model_fields[key].metadata:
+        for kind in _BOUND_CHECKS:
+            bound = getattr(constraint, kind, None)
+            if bound is not None:
+                bounds.append((kind, bound))
+    return bounds
+
+
+def _rename_references(parameters: Dict, old_name: str, new_name: str) -> Dict:
+    """
+    Get the parameter values to update when an object referenced by name is renamed.
+    """
+    changes = {}
+    for key in ("Base", "Tool"):
+        if parameters.get(key) == old_name:
+            changes[key] = new_name
+    shapes = parameters.get("Shapes")
+    if isinstance(shapes, list) and old_name in shapes:
+        changes["Shapes"] = [new_name if s == old_name else s for s in shapes]
+    return changes
+
+
+def _get_dependencies(parameters: Dict) -> List[str]:
+    """
+    Get the names of the objects referenced by an object's parameters.
+    """
+    dependencies = []
+    for key in ("Base", "Tool"):
+        value = parameters.get(key)
+        if isinstance(value, str):
+            dependencies.append(value)
+    shapes = parameters.get("Shapes")
+    if isinstance(shapes, list):
+        dependencies.extend(s for s in shapes if isinstance(s, str))
+    return dependencies
+
+
 class PythonJcadObject(BaseModel):
     class Config:
         arbitrary_types_allowed = True
@@ -1030,16 +2437,74 @@ class PythonJcadObject(BaseModel):
         IChamfer,
     ]
     metadata: Optional[ShapeMetadata]
-    _caddoc = Optional[CadDocument]
-    _parent = Optional[CadDocument]
+    _parent: Optional[CadDocument] = None
 
     def __init__(__pydantic_self__, parent, **data: Any) -> None:  # noqa
         super().__init__(**data)
-        __pydantic_self__._caddoc = CadDocument()
-        __pydantic_self__._caddoc.add_object(__pydantic_self__)
         __pydantic_self__._parent = parent
 
 
+class JcadObjectView:
+    """
+    Read-only view on an object stored in a CadDocument.
+
+    The view exposes the same attributes as :class:`PythonJcadObject` but
+    reads them lazily from the underlying Y map. The parameters are
+    validated into their pydantic model on first access only.
+    """
+
+    __slots__ = ("_yobject", "_parameters", "_deferred")
+
+    def __init__(self, yobject: Map, deferred: Optional[_DeferredContent] = None):
+        self._yobject = yobject
+        self._parameters = None
+        self._deferred = deferred
+
+    @property
+    def name(self) -> str:
+        return self._yobject["name"]
+
+    @property
+    def visible(self) -> bool:
+        return self._yobject.get("visible", True)
+
+    @property
+    def shape(self) -> Parts:
+        return Parts(self._yobject["shape"])
+
+    @property
+    def parameters(self):
+        if self._parameters is None:
+            parameters = self._yobject.get("parameters", {})
+            if self._deferred is not None:
+                parameters = dict(parameters, Content=self._deferred.load())
+            self._parameters = OBJECT_FACTORY.create_parameters(
+                self._yobject["shape"], parameters
+            )
+        return self._parameters
+
+    @property
+    def metadata(self) -> Optional[ShapeMetadata]:
+        meta = self._yobject.get("shapeMetadata")
+        return ShapeMetadata(**meta) if meta is not None else None
+
+    def to_object(self, parent: Optional[CadDocument] = None) -> PythonJcadObject:
+        """
+        Convert the view to a full :class:`PythonJcadObject`.
+
+        The returned object owns a copy of the parameters, so it can be
+        modified without affecting the view.
+        """
+        return PythonJcadObject(
+            parent=parent,
+            name=self.name,
+            shape=self.shape,
+            parameters=self.parameters.model_copy(deep=True),
+            metadata=self._yobject.get("shapeMetadata"),
+            visible=self.visible,
+        )
+
+
 class SingletonMeta(type):
     _instances = {}
 
@@ -1058,6 +2523,9 @@ class ObjectFactoryManager(metaclass=SingletonMeta):
         if shape_type not in self._factories:
             self._factories[shape_type] = cls
 
+    def has_factory(self, shape_type: Optional[str]) -> bool:
+        return shape_type in self._factories
+
     def create_object(
         self, data: Dict, parent: Optional[CadDocument] = None
     ) -> Optional[PythonJcadObject]:
@@ -1065,25 +2533,37 @@ class ObjectFactoryManager(metaclass=SingletonMeta):
         name: str = data.get("name", None)
         meta = data.get("shapeMetadata", None)
         visible = data.get("visible", True)
-        
+
         if object_type and object_type in self._factories:
-            Model = self._factories[object_type]
-            args = {}
-            params = data["parameters"]
-            for field in Model.model_fields:
-                args[field] = params.get(field, None)
-            obj_params = Model(**args)
+            obj_params = self.create_parameters(object_type, data["parameters"])
             return PythonJcadObject(
                 parent=parent,
                 name=name,
                 shape=object_type,
                 parameters=obj_params,
                 metadata=meta,
-                visible=visible
+                visible=visible,
             )
 
         return None
 
+    def create_parameters(self, shape_type: str, params: Dict) -> Optional[BaseModel]:
+        if shape_type in self._factories:
+            Model = self._factories[shape_type]
+            args = {}
+            for field_name, field in Model.model_fields.items():
+                # e.g. IAny.Type is generated as Type_1 with the "Type" alias
+                key = field.alias or field_name
+                args[key] = params.get(key, None)
+            if shape_type == Parts.Part__Any.value and isinstance(
+                args.get("Type"), str
+            ):
+                # Older documents store e.g. "STEP", the frontend ignores the case.
+                args["Type"] = args["Type"].lower()
+            return Model(**args)
+
+        return None
+
 
 OBJECT_FACTORY = ObjectFactoryManager()
 
@@ -1099,4 +2579,4 @@ OBJECT_FACTORY.register_factory(Parts.Part__Sphere.value, ISphere)
 OBJECT_FACTORY.register_factory(Parts.Part__Torus.value, ITorus)
 OBJECT_FACTORY.register_factory(Parts.Sketcher__SketchObject.value, ISketchObject)
 OBJECT_FACTORY.register_factory(Parts.Part__Chamfer.value, IChamfer)
-OBJECT_FACTORY.register_factory(Parts.Part__Fillet.value, IFillet)
\ No newline at end of file
+OBJECT_FACTORY.register_factory(Parts.Part__Fillet.value, IFillet)
@@ -300,14 +300,25 @@ class FeatureExtractionService:
         and tool shapes are already available in the cache.
 
         Process objects in order, as boolean operations depend on their
-        operands being created first.
+        operands being created first. When the document provides a dependency
+        graph, it is used to order the objects and to pull in the operands
+        of the requested objects.
         """
+        topological_order = getattr(self.cad_document, "topological_order", None)
+        if topological_order is not None:
+            try:
+                object_names = topological_order(object_names)
+            except ValueError as e:
+                # E.g. a reference cycle from a collaborator's edit; the
+                # shapes that cannot be built are reported per object.
+                logger.warning(f"Could not order objects by dependency: {e}")
+
         for obj_name in object_names:
             # Skip if already cached
             if obj_name in self._shape_cache:
                 continue
 
-            obj = self.cad_document.get_object(obj_name)
+            obj = self._get_object(obj_name)
             if not obj:
                 continue
 
@@ -321,6 +332,18 @@ class FeatureExtractionService:
             except Exception as e:
                 logger.debug(f"Could not cache shape for {obj_name}: {e}")
 
+    def _get_object(self, obj_name: str):
+        """
+        Get an object from the document for read-only use.
+
+        Prefers the lightweight object view when the document provides one,
+        so that extraction passes do not build a full pydantic object each time.
+        """
+        get_view = getattr(self.cad_document, "get_object_view", None)
+        if get_view is not None:
+            return get_view(obj_name)
+        return self.cad_document.get_object(obj_name)
+
     def _identify_final_objects(self) -> set:
         """
         Identify which objects are final results (not intermediate boolean operations).
@@ -336,7 +359,7 @@ class FeatureExtractionService:
         objects = self.cad_document.objects
 
         for obj_name in objects:
-            obj = self.cad_document.get_object(obj_name)
+            obj = self._get_object(obj_name)
             if not obj:
                 continue
 
@@ -386,7 +409,7 @@ class FeatureExtractionService:
         Returns:
             FeatureExtractionResult containing extracted features
         """
-        obj = self.cad_document.get_object(obj_name)
+        obj = self._get_object(obj_name)
         if not obj:
             raise ValueError(f"Object {obj_name} not found")
 
@@ -1422,7 +1445,9 @@ class FeatureExtractionService:
         shape_type = obj.shape.value if hasattr(obj.shape, 'value') else str(obj.shape)
 
         # Reconstruct OCC shape
-        occ_shape = self.cad_document._reconstruct_occ_shape(obj, self._shape_cache)
+        occ_shape = self.cad_document._reconstruct_occ_shape(
+            obj, self._shape_cache, refine=True
+        )
 
         if not occ_shape:
             # For boolean operations, this is expected if base/tool shapes aren't available
@@ -0,0 +1,514 @@
+"""
+Post-processing of the GLB files written by ``CadDocument.export``.
+
+``RWGltf_CafWriter`` stores positions and normals as float32, and the
+triangles of each face in the order they were meshed. This module rewrites
+a GLB file with:
+
+- vertex attributes quantized to integers, as allowed by the
+  ``KHR_mesh_quantization`` extension. Positions use 16 bits, relative to
+  the bounding box of their mesh, whose node gets the dequantization
+  transform. Normals use 8 bits;
+- triangles reordered for the post-transform vertex cache with the Tipsify
+  algorithm, and vertices renumbered in the order of their first use, so
+  that neighbouring data is fetched together and compresses better.
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_GLB_MAGIC = b"glTF"
+_JSON_CHUNK = 0x4E4F534A
+_BIN_CHUNK = 0x004E4942
+
+_BYTE = 5120
+_UNSIGNED_BYTE = 5121
+_SHORT = 5122
+_UNSIGNED_SHORT = 5123
+_UNSIGNED_INT = 5125
+_FLOAT = 5126
+_DTYPES = {
+    _BYTE: "i1",
+    _UNSIGNED_BYTE: "u1",
+    _SHORT: "<i2",
+    _UNSIGNED_SHORT: "<u2",
+    _UNSIGNED_INT: "<u4",
+    _FLOAT: "<f4",
+}
+_COMPONENTS = {
+    "SCALAR": 1,
+    "VEC2": 2,
+    "VEC3": 3,
+    "VEC4": 4,
+    "MAT2": 4,
+    "MAT3": 9,
+    "MAT4": 16,
+}
+
+_ARRAY_BUFFER = 34962
+_ELEMENT_ARRAY_BUFFER = 34963
+_TRIANGLES = 4
+
+QUANTIZATION_EXTENSION = "KHR_mesh_quantization"
+
+
+@dataclass
+class GlbCompression:
+    """
+    Options of the GLB post-processing.
+
+    Args:
+        quantize: Store positions and normals as integers, with the
+            ``KHR_mesh_quantization`` extension
+        reorder: Reorder triangles and vertices for vertex cache locality
+        cache_size: Size of the vertex cache targeted by the reordering
+    """
+
+    quantize: bool = True
+    reorder: bool = True
+    cache_size: int = 16
+
+
+def read_glb(path: str) -> Tuple[Dict, bytes]:
+    """
+    Read the JSON and the binary chunk of a GLB file.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, length = struct.unpack_from("<4sII", data, 0)
+    if magic != _GLB_MAGIC or version != 2:
+        raise ValueError(f"{path} is not a glTF 2.0 binary file")
+    gltf = None
+    binary = b""
+    offset = 12
+    while offset < length:
+        chunk_length, chunk_type = struct.unpack_from("<II", data, offset)
+        chunk = data[offset + 8 : offset + 8 + chunk_length]
+        if chunk_type == _JSON_CHUNK:
+            gltf = json.loads(chunk)
+        elif chunk_type == _BIN_CHUNK:
+            binary = chunk
+        offset += 8 + chunk_length
+    if gltf is None:
+        raise ValueError(f"{path} has no JSON chunk")
+    return gltf, binary
+
+
+def write_glb(path: str, gltf: Dict, binary: bytes) -> None:
+    """
+    Write a GLB file from its JSON and its binary chunk.
+    """
+    content = json.dumps(gltf, separators=(",", ":")).encode()
+    content += b" " * (-len(content) % 4)
+    binary = bytes(binary) + b"\0" * (-len(binary) % 4)
+    length = 12 + 8 + len(content) + (8 + len(binary) if binary else 0)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<4sII", _GLB_MAGIC, 2, length))
+        f.write(struct.pack("<II", len(content), _JSON_CHUNK))
+        f.write(content)
+        if binary:
+            f.write(struct.pack("<II", len(binary), _BIN_CHUNK))
+            f.write(binary)
+
+
+def tipsify(
+    triangles: List[Tuple[int, int, int]], vertex_count: int, cache_size: int
+) -> List[int]:
+    """
+    Order triangles for a post-transform vertex cache.
+
+    This is the Tipsify algorithm of Sander, Nehab and Barczak, "Fast
+    Triangle Reordering for Vertex Locality and Reduced Overdraw" (2007).
+
+    :param triangles: The vertex indices of the triangles.
+    :param vertex_count: The number of vertices.
+    :param cache_size: The size of the targeted vertex cache.
+    :return: The indices of the triangles, in their new order.
+    """
+    adjacency: List[List[int]] = [[] for _ in range(vertex_count)]
+    for index, triangle in enumerate(triangles):
+        for vertex in triangle:
+            adjacency[vertex].append(index)
+    live = [len(faces) for faces in adjacency]
+    cache_time = [0] * vertex_count
+    emitted = [False] * len(triangles)
+    dead_end: List[int] = []
+    order: List[int] = []
+
+    time = cache_size + 1
+    cursor = 0
+    fanning = 0 if vertex_count else -1
+    while fanning >= 0:
+        candidates = []
+        for index in adjacency[fanning]:
+            if emitted[index]:
+                continue
+            emitted[index] = True
+            order.append(index)
+            for vertex in triangles[index]:
+                dead_end.append(vertex)
+                candidates.append(vertex)
+                live[vertex] -= 1
+                if time - cache_time[vertex] > cache_size:
+                    cache_time[vertex] = time
+                    time += 1
+
+        # The next fanning vertex is the candidate that stays in the cache
+        # the longest while its remaining triangles are emitted.
+        fanning = -1
+        best = -1
+        for vertex in candidates:
+            if live[vertex] > 0:
+                priority = 0
+                if time - cache_time[vertex] + 2 * live[vertex] <= cache_size:
+                    priority = time - cache_time[vertex]
+                if priority > best:
+                    best = priority
+                    fanning = vertex
+        while fanning < 0 and dead_end:
+            vertex = dead_end.pop()
+            if live[vertex] > 0:
+                fanning = vertex
+        while fanning < 0 and cursor < vertex_count:
+            if live[cursor] > 0:
+                fanning = cursor
+            cursor += 1
+    return order
+
+
+class _Rewriter:
+    """
+    Copy of the buffers of a glTF asset, to which rewritten data is appended.
+    """
+
+    def __init__(self, gltf: Dict, binary: bytes):
+        self._gltf = gltf
+        self._binary = binary
+        self.data = bytearray()
+        self.buffer_views: List[Dict] = []
+        self.accessors: List[Dict] = []
+        self._copied_views: Dict[int, int] = {}
+        self._copied_accessors: Dict[int, int] = {}
+
+    def _append(self, content: bytes) -> int:
+        self.data += b"\0" * (-len(self.data) % 4)
+        offset = len(self.data)
+        self.data += content
+        return offset
+
+    def copy_view(self, index: int) -> int:
+        if index not in self._copied_views:
+            view = dict(self._gltf["bufferViews"][index])
+            start = view.get("byteOffset", 0)
+            view["byteOffset"] = self._append(
+                self._binary[start : start + view["byteLength"]]
+            )
+            view["buffer"] = 0
+            self._copied_views[index] = len(self.buffer_views)
+            self.buffer_views.append(view)
+        return self._copied_views[index]
+
+    def copy_accessor(self, index: int) -> int:
+        if index not in self._copied_accessors:
+            accessor = dict(self._gltf["accessors"][index])
+            if "bufferView" in accessor:
+                accessor["bufferView"] = self.copy_view(accessor["bufferView"])
+            sparse = accessor.get("sparse")
+            if sparse is not None:
+                sparse = json.loads(json.dumps(sparse))
+                sparse["indices"]["bufferView"] = self.copy_view(
+                    sparse["indices"]["bufferView"]
+                )
+                sparse["values"]["bufferView"] = self.copy_view(
+                    sparse["values"]["bufferView"]
+                )
+                accessor["sparse"] = sparse
+            self._copied_accessors[index] = len(self.accessors)
+            self.accessors.append(accessor)
+        return self._copied_accessors[index]
+
+    def read(self, index: int):
+        """
+        Read an accessor as an array of shape (count, components).
+        """
+        accessor = self._gltf["accessors"][index]
+        dtype = np.dtype(_DTYPES[accessor["componentType"]])
+        components = _COMPONENTS[accessor["type"]]
+        count = accessor["count"]
+        if "bufferView" not in accessor:
+            return np.zeros((count, components), dtype)
+        view = self._gltf["bufferViews"][accessor["bufferView"]]
+        stride = view.get("byteStride", dtype.itemsize * components)
+        return np.ndarray(
+            (count, components),
+            dtype,
+            buffer=self._binary,
+            offset=view.get("byteOffset", 0) + accessor.get("byteOffset", 0),
+            strides=(stride, dtype.itemsize),
+        ).copy()
+
+    def write(
+        self,
+        values,
+        component_type: int,
+        accessor_type: str,
+        normalized: bool = False,
+        target: Optional[int] = _ARRAY_BUFFER,
+        bounds: bool = False,
+    ) -> int:
+        """
+        Append an accessor, padding vertex attributes to 4-byte elements.
+        """
+        dtype = np.dtype(_DTYPES[component_type])
+        values = np.ascontiguousarray(values, dtype).reshape(len(values), -1)
+        view: Dict[str, Any] = {"buffer": 0}
+        element_size = values.shape[1] * dtype.itemsize
+        if target == _ARRAY_BUFFER and element_size % 4:
+            padding = (-element_size % 4) // dtype.itemsize
+            values_padded = np.zeros((len(values), values.shape[1] + padding), dtype)
+            values_padded[:, : values.shape[1]] = values
+            view["byteStride"] = values_padded.shape[1] * dtype.itemsize
+            content = values_padded.tobytes()
+        else:
+            content = values.tobytes()
+        view["byteOffset"] = self._append(content)
+        view["byteLength"] = len(content)
+        if target is not None:
+            view["target"] = target
+        self.buffer_views.append(view)
+
+        accessor: Dict[str, Any] = {
+            "bufferView": len(self.buffer_views) - 1,
+            "componentType": component_type,
+            "count": len(values),
+            "type": accessor_type,
+        }
+        if normalized:
+            accessor["normalized"] = True
+        if bounds and len(values):
+            cast = float if component_type == _FLOAT else int
+            accessor["min"] = [cast(v) for v in values.min(axis=0)]
+            accessor["max"] = [cast(v) for v in values.max(axis=0)]
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+
+def _is_float(gltf: Dict, index: int) -> bool:
+    accessor = gltf["accessors"][index]
+    return accessor["componentType"] == _FLOAT and "sparse" not in accessor
+
+
+def _position_transform(rewriter: _Rewriter, gltf: Dict, mesh: Dict):
+    """
+    Get the center and scale mapping the positions of a mesh to [-1, 1].
+    """
+    lows, highs = [], []
+    for primitive in mesh["primitives"]:
+        position = primitive.get("attributes", {}).get("POSITION")
+        if position is None or not _is_float(gltf, position) or "targets" in primitive:
+            return None
+        values = rewriter.read(position)
+        if len(values):
+            lows.append(values.min(axis=0))
+            highs.append(values.max(axis=0))
+    if not lows:
+        return None
+    low = np.min(lows, axis=0)
+    high = np.max(highs, axis=0)
+    center = (low + high) / 2
+    # A uniform scale leaves the normals of the mesh unchanged.
+    scale = float(np.max(high - low)) / 2 or 1.0
+    return center, scale
+
+
+def _rewrite_primitive(
+    rewriter: _Rewriter,
+    gltf: Dict,
+    primitive: Dict,
+    options: GlbCompression,
+    transform,
+    shared: bool,
+) -> Dict:
+    primitive = dict(primitive)
+    attributes = dict(primitive.get("attributes", {}))
+    remap = None
+
+    indices = primitive.get("indices")
+    triangles = (
+        primitive.get("mode", _TRIANGLES) == _TRIANGLES and "targets" not in primitive
+    )
+    if indices is not None and triangles and options.reorder:
+        faces = rewriter.read(indices).reshape(-1, 3).astype(np.int64)
+        vertex_count = gltf["accessors"][next(iter(attributes.values()))]["count"]
+        order = tipsify(
+            [tuple(face) for face in faces.tolist()], vertex_count, options.cache_size
+        )
+        faces = faces[order]
+        flat = faces.ravel()
+        # Vertices shared with another primitive keep their numbering.
+        if not shared and len(flat):
+            _, first_use = np.unique(flat, return_index=True)
+            remap = flat[np.sort(first_use)]
+            numbering = np.full(vertex_count, -1, np.int64)
+            numbering[remap] = np.arange(len(remap))
+            flat = numbering[flat]
+        component_type = (
+            _UNSIGNED_INT if flat.size and flat.max() > 0xFFFF else _UNSIGNED_SHORT
+        )
+        primitive["indices"] = rewriter.write(
+            flat, component_type, "SCALAR", target=_ELEMENT_ARRAY_BUFFER
+        )
+    elif indices is not None:
+        primitive["indices"] = rewriter.copy_accessor(indices)
+
+    for name, index in attributes.items():
+        accessor = gltf["accessors"][index]
+        quantize_position = (
+            options.quantize and name == "POSITION" and transform is not None
+        )
+        quantize_normal = (
+            options.quantize and name == "NORMAL" and _is_float(gltf, index)
+        )
+        if remap is None and not quantize_position and not quantize_normal:
+            attributes[name] = rewriter.copy_accessor(index)
+            continue
+        values = rewriter.read(index)
+        if remap is not None:
+            values = values[remap]
+        if quantize_position:
+            center, scale = transform
+            quantized = np.round((values - center) / scale * 32767)
+            attributes[name] = rewriter.write(
+                np.clip(quantized, -32767, 32767),
+                _SHORT,
+                "VEC3",
+                normalized=True,
+                bounds=True,
+            )
+        elif quantize_normal:
+            attributes[name] = rewriter.write(
+                np.clip(np.round(values * 127), -127, 127),
+                _BYTE,
+                "VEC3",
+                normalized=True,
+            )
+        else:
+            attributes[name] = rewriter.write(
+                values,
+                accessor["componentType"],
+                accessor["type"],
+                normalized=accessor.get("normalized", False),
+                bounds="min" in accessor,
+            )
+    primitive["attributes"] = attributes
+    return primitive
+
+
+def _is_quantized(gltf: Dict) -> bool:
+    """
+    Whether a mesh stores positions or normals in a type only allowed by
+    ``KHR_mesh_quantization``.
+    """
+    for mesh in gltf.get("meshes", []):
+        for primitive in mesh["primitives"]:
+            attributes = primitive.get("attributes", {})
+            for name in ("POSITION", "NORMAL", "TANGENT"):
+                index = attributes.get(name)
+                if (
+                    index is not None
+                    and gltf["accessors"][index]["componentType"] != _FLOAT
+                ):
+                    return True
+    return False
+
+
+def compress_glb(
+    path: str, options: Optional[GlbCompression] = None, output: Optional[str] = None
+) -> None:
+    """
+    Quantize and reorder the meshes of a GLB file.
+
+    :param path: The GLB file.
+    :param options: What to do, all of it by default.
+    :param output: Where to write the result, ``path`` by default.
+    """
+    options = options or GlbCompression()
+    gltf, binary = read_glb(path)
+    rewriter = _Rewriter(gltf, binary)
+
+    usage: Dict[int, int] = {}
+    for mesh in gltf.get("meshes", []):
+        for primitive in mesh["primitives"]:
+            for index in set(primitive.get("attributes", {}).values()):
+                usage[index] = usage.get(index, 0) + 1
+
+    transforms = {}
+    for mesh_index, mesh in enumerate(gltf.get("meshes", [])):
+        transform = (
+            _position_transform(rewriter, gltf, mesh) if options.quantize else None
+        )
+        mesh["primitives"] = [
+            _rewrite_primitive(
+                rewriter,
+                gltf,
+                primitive,
+                options,
+                transform,
+                any(
+                    usage[index] > 1
+                    for index in primitive.get("attributes", {}).values()
+                ),
+            )
+            for primitive in mesh["primitives"]
+        ]
+        if transform is not None:
+            transforms[mesh_index] = transform
+
+    # The dequantization transform goes on a child of each node using a
+    # quantized mesh, so that it does not apply to the other children.
+    nodes = gltf.get("nodes", [])
+    for node in list(nodes):
+        transform = transforms.get(node.get("mesh"))
+        if transform is None:
+            continue
+        center, scale = transform
+        child = {
+            "mesh": node.pop("mesh"),
+            "translation": [float(v) for v in center],
+            "scale": [scale] * 3,
+        }
+        node.setdefault("children", []).append(len(nodes))
+        nodes.append(child)
+
+    for skin in gltf.get("skins", []):
+        if "inverseBindMatrices" in skin:
+            skin["inverseBindMatrices"] = rewriter.copy_accessor(
+                skin["inverseBindMatrices"]
+            )
+    for animation in gltf.get("animations", []):
+        for sampler in animation.get("samplers", []):
+            sampler["input"] = rewriter.copy_accessor(sampler["input"])
+            sampler["output"] = rewriter.copy_accessor(sampler["output"])
+    for image in gltf.get("images", []):
+        if "bufferView" in image:
+            image["bufferView"] = rewriter.copy_view(image["bufferView"])
+
+    gltf["accessors"] = rewriter.accessors
+    gltf["bufferViews"] = rewriter.buffer_views
+    if rewriter.data:
+        gltf["buffers"] = [{"byteLength": len(rewriter.data)}]
+    else:
+        gltf.pop("buffers", None)
+    # Normals are quantized even in meshes whose positions stay float.
+    if _is_quantized(gltf):
+        for key in ("extensionsUsed", "extensionsRequired"):
+            extensions = gltf.setdefault(key, [])
+            if QUANTIZATION_EXTENSION not in extensions:
+                extensions.append(QUANTIZATION_EXTENSION)
+    write_glb(output or path, gltf, bytes(rewriter.data))
@@ -0,0 +1,313 @@
+"""
+Incremental reader for .jcad files.
+
+A .jcad file is a single JSON object whose ``objects`` array may embed
+multi-megabyte STEP or BREP strings. :class:`JcadReader` walks the file in
+fixed-size chunks and hands out one top-level value, or one element of the
+``objects`` array, at a time, so that only the value being decoded needs to
+be held in memory. Large strings at a given key path, such as the
+``Content`` of an object, can be skipped over without being kept at all:
+their location in the file is recorded instead.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import IO, Any, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+_WHITESPACE = b" \t\r\n"
+# Characters that matter while scanning outside and inside a string. Every
+# byte of a multi-byte UTF-8 sequence is >= 0x80, so scanning bytes is safe.
+_STRUCTURE = re.compile(rb'[{}\[\]"]')
+# The same, with the separators telling keys from values in an object.
+_TOKEN = re.compile(rb'[{}\[\]",:]')
+_STRING_SPECIAL = re.compile(rb'["\\]')
+_SCALAR_END = re.compile(rb"[,}\]\s]")
+
+
+class RawValue(NamedTuple):
+    """A JSON value located in the file, not decoded yet."""
+
+    offset: int
+    """Position of the first byte of the value in the file."""
+    data: bytes
+    """The encoded value."""
+    deferred: Optional[Tuple[int, int]] = None
+    """Offset and length of the string left out of ``data``, if any."""
+
+    def decode(self) -> Any:
+        return json.loads(self.data)
+
+
+class JcadReader:
+    """
+    Stream the top-level entries of a .jcad file.
+
+    .. code-block:: Python
+
+        with JcadReader(path) as reader:
+            for key in reader.keys():
+                if key == "objects":
+                    for raw in reader.iter_array():
+                        obj = raw.decode()
+                else:
+                    value = reader.read_value().decode()
+
+    Every key yielded by :meth:`keys` must be consumed with either
+    :meth:`read_value` or :meth:`iter_array` before asking for the next one.
+    """
+
+    def __init__(self, path: str | Path, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self._file: IO[bytes] = open(path, "rb")
+        self.chunk_size = chunk_size
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._buffer = bytearray()
+        # File offset of ``_buffer[0]`` and read position inside the buffer.
+        self._offset = 0
+        self._pos = 0
+
+    def __enter__(self) -> JcadReader:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+    @property
+    def position(self) -> int:
+        """Number of bytes of the file consumed so far."""
+        return self._offset + self._pos
+
+    def keys(self) -> Iterator[str]:
+        """Iterate over the keys of the top-level JSON object."""
+        self._expect(b"{")
+        if self._peek() == b"}":
+            self._pos += 1
+            return
+        while True:
+            key = self.read_value().decode()
+            if not isinstance(key, str):
+                raise self._error("Expected a string key")
+            self._expect(b":")
+            yield key
+            if self._next_separator(b"}"):
+                return
+
+    def read_value(
+        self, defer: Optional[Sequence[str]] = None, defer_above: int = 0
+    ) -> RawValue:
+        """
+        Read the next JSON value without decoding it.
+
+        :param defer: A key path, e.g. ``("parameters", "Content")``. A string
+            found there in an object is skipped over if it is larger than
+            ``defer_above`` bytes: it is replaced by an empty string in the
+            value, and its location is returned in ``deferred``.
+        """
+        self._peek()
+        start = self._pos
+        first = self._buffer[start : start + 1]
+        if defer is not None and first == b"{":
+            path = [json.dumps(key).encode() for key in defer]
+            return self._read_deferring(path, defer_above)
+        if first in (b"{", b"["):
+            end = self._scan_container(start)
+        elif first == b'"':
+            end = self._scan_string(start + 1)
+        else:
+            end = self._scan_scalar(start)
+        # Scanning may have dropped consumed bytes, shifting the buffer.
+        start = self._pos
+        self._pos = end
+        return RawValue(self._offset + start, bytes(self._buffer[start:end]))
+
+    def iter_array(
+        self, defer: Optional[Sequence[str]] = None, defer_above: int = 0
+    ) -> Iterator[RawValue]:
+        """
+        Iterate over the elements of the JSON array at the read position.
+
+        The arguments are passed to :meth:`read_value` for each element.
+        """
+        self._expect(b"[")
+        if self._peek() == b"]":
+            self._pos += 1
+            return
+        while True:
+            yield self.read_value(defer, defer_above)
+            if self._next_separator(b"]"):
+                return
+
+    def _fill(self) -> bool:
+        chunk = self._file.read(self.chunk_size)
+        if not chunk:
+            return False
+        # Drop what was consumed so the buffer only holds the current value.
+        self._offset += self._pos
+        del self._buffer[: self._pos]
+        self._buffer += chunk
+        self._pos = 0
+        return True
+
+    def _peek(self) -> bytes:
+        while True:
+            buffer = self._buffer
+            pos = self._pos
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buffer):
+                return buffer[pos : pos + 1]
+            if not self._fill():
+                raise self._error("Unexpected end of file")
+
+    def _expect(self, char: bytes) -> None:
+        if self._peek() != char:
+            raise self._error(f"Expected {char.decode()!r}")
+        self._pos += 1
+
+    def _next_separator(self, closing: bytes) -> bool:
+        char = self._peek()
+        self._pos += 1
+        if char == closing:
+            return True
+        if char != b",":
+            raise self._error(f"Expected ',' or {closing.decode()!r}")
+        return False
+
+    def _search(
+        self, pattern: re.Pattern, index: int
+    ) -> Tuple[Optional[re.Match], int]:
+        """Search from ``index``, reading more chunks until ``pattern`` matches."""
+        while True:
+            match = pattern.search(self._buffer, index)
+            if match is not None:
+                return match, index
+            index = len(self._buffer)
+            consumed = self._pos
+            if not self._fill():
+                return None, index
+            index -= consumed
+
+    def _scan_container(self, index: int) -> int:
+        depth = 0
+        while True:
+            match, index = self._search(_STRUCTURE, index)
+            if match is None:
+                raise self._error("Unexpected end of file")
+            char = match.group()
+            index = match.end()
+            if char == b'"':
+                index = self._scan_string(index)
+            elif char in b"{[":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return index
+
+    def _read_deferring(self, path: List[bytes], defer_above: int) -> RawValue:
+        offset = self.position
+        # The parts of the value before the read position, once a string
+        # has been skipped.
+        pieces: List[bytes] = []
+        deferred = None
+        # The key of each open container, None in arrays and before a key.
+        keys: List[Optional[bytes]] = []
+        expect_key = False
+        index = self._pos
+        while True:
+            match, index = self._search(_TOKEN, index)
+            if match is None:
+                raise self._error("Unexpected end of file")
+            char = match.group()
+            index = match.end()
+            if char == b'"':
+                if expect_key:
+                    start = match.start()
+                    index = self._scan_string(index)
+                    keys[-1] = bytes(self._buffer[start:index])
+                elif keys == path:
+                    pieces.append(bytes(self._buffer[self._pos : match.start()]))
+                    self._pos = match.start()
+                    string_offset = self.position
+                    index = self._scan_string(index, keep=False)
+                    length = self._offset + index - string_offset
+                    if length > defer_above:
+                        pieces.append(b'""')
+                        deferred = (string_offset, length)
+                    else:
+                        pieces.append(self._read_at(string_offset, length))
+                    self._pos = index
+                else:
+                    index = self._scan_string(index)
+            elif char in b"{[":
+                keys.append(None)
+                expect_key = char == b"{"
+            elif char in b"}]":
+                keys.pop()
+                if not keys:
+                    pieces.append(bytes(self._buffer[self._pos : index]))
+                    self._pos = index
+                    return RawValue(offset, b"".join(pieces), deferred)
+            elif char == b",":
+                # Only objects have keys, arrays keep None.
+                expect_key = keys[-1] is not None
+                if expect_key:
+                    keys[-1] = None
+            else:
+                expect_key = False
+
+    def _read_at(self, offset: int, length: int) -> bytes:
+        """Read bytes already scanned, without moving the read position."""
+        position = self._file.tell()
+        try:
+            self._file.seek(offset)
+            return self._file.read(length)
+        finally:
+            self._file.seek(position)
+
+    def _scan_string(self, index: int, keep: bool = True) -> int:
+        """
+        Return the index after the closing quote of a string.
+
+        :param keep: Whether to keep the string in the buffer. If not, the
+            read position follows the scan so that it is dropped.
+        """
+        while True:
+            if not keep:
+                self._pos = index
+            match, index = self._search(_STRING_SPECIAL, index)
+            if match is None:
+                raise self._error("Unterminated string")
+            index = match.end()
+            if match.group() == b'"':
+                return index
+            # Skip the escaped character, which may be in the next chunk.
+            if index >= len(self._buffer):
+                consumed = self._pos
+                if not self._fill():
+                    raise self._error("Unterminated string")
+                index -= consumed
+            index += 1
+
+    def _scan_scalar(self, index: int) -> int:
+        match, index = self._search(_SCALAR_END, index)
+        return match.start() if match is not None else len(self._buffer)
+
+    def _error(self, message: str) -> ValueError:
+        return ValueError(f"{message} at byte {self.position} of {self._file.name}")
+
+
+def read_value_at(path: str | Path, offset: int, length: int) -> Any:
+    """Decode the JSON value stored at ``offset`` in a file."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return json.loads(f.read(length))
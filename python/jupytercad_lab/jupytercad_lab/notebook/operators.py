@@ -0,0 +1,769 @@
+"""
+OpenCascade implementation of the JupyterCAD operators.
+
+This is the Python counterpart of ``packages/occ-worker/src/occapi``: every
+shape type of the schema is registered with a function building its
+``TopoDS_Shape`` from the object's parameters and the shapes of the objects
+it references, so that documents can be evaluated without a browser.
+
+All the OpenCascade imports are done when an operator runs, so that this
+module can be imported without pythonocc-core.
+
+Shapes are shared: the shape of an object is reused by every object built
+from it, by the shape cache and by other documents. Operators must treat
+the shapes they are given as read-only and never modify them in place.
+
+The ``Refine`` parameter of booleans is not applied by the operators: the
+document refines only the shapes it hands out, see :func:`apply_refine`.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import tempfile
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__file__)
+
+# Tolerance of the boolean operations, so that coincident faces are handled.
+FUZZY_VALUE = 1.0e-6
+
+
+class NaryStrategy(Enum):
+    """
+    How ``Part::MultiFuse`` and ``Part::MultiCommon`` combine their shapes.
+    """
+
+    ONE_PASS = "one_pass"
+    """All the shapes are given to a single boolean operation."""
+    BALANCED = "balanced"
+    """Shapes are combined pairwise, as a balanced binary tree."""
+
+
+@dataclass
+class EngineOptions:
+    """
+    Options of the OpenCascade operators.
+
+    Args:
+        nary_strategy: How multi-shape booleans are evaluated
+        parallel_booleans: Run the boolean operations on several threads
+        parallel_meshing: Mesh the faces of a shape on several threads
+        threads: Number of threads used by OpenCascade, all the cores by default
+        bounding_box_checks: Skip the booleans whose operands' bounding boxes
+            do not overlap, see :func:`short_circuit_info`
+    """
+
+    nary_strategy: NaryStrategy = NaryStrategy.ONE_PASS
+    parallel_booleans: bool = False
+    parallel_meshing: bool = False
+    threads: Optional[int] = None
+    bounding_box_checks: bool = True
+
+
+DEFAULT_ENGINE_OPTIONS = EngineOptions()
+
+
+@dataclass(frozen=True)
+class MeshQuality:
+    """
+    Tessellation settings, relative to the size of each shape.
+
+    Args:
+        relative_deflection: Maximum distance between the mesh and the surface,
+            as a fraction of the diagonal of the shape's bounding box
+        angular_deflection: Maximum angle between the normals of adjacent
+            triangles, in radians
+    """
+
+    relative_deflection: float
+    angular_deflection: float
+
+
+MESH_QUALITIES: Dict[str, MeshQuality] = {
+    "draft": MeshQuality(relative_deflection=0.005, angular_deflection=0.8),
+    "normal": MeshQuality(relative_deflection=0.001, angular_deflection=0.5),
+    "fine": MeshQuality(relative_deflection=0.0002, angular_deflection=0.2),
+}
+
+
+def get_mesh_quality(quality: str | MeshQuality) -> MeshQuality:
+    """
+    Get a mesh quality from its preset name, one of :data:`MESH_QUALITIES`.
+    """
+    if isinstance(quality, MeshQuality):
+        return quality
+    try:
+        return MESH_QUALITIES[quality]
+    except KeyError:
+        raise ValueError(
+            f"Unknown mesh quality {quality!r}, expected one of {', '.join(MESH_QUALITIES)}"
+        ) from None
+
+
+OperatorFunc = Callable[[Any, Dict[str, Any], EngineOptions], Optional[Any]]
+
+
+class _Operator(NamedTuple):
+    func: OperatorFunc
+    apply_placement: bool
+
+
+_OPERATORS: Dict[str, _Operator] = {}
+
+
+def register_operator(shape_type: str, apply_placement: bool = True):
+    """
+    Register the function building the shapes of a shape type.
+
+    The function is called with the parameters of the object, the shapes of
+    the other objects by name and the :class:`EngineOptions`, and returns
+    the shape or None.
+
+    :param shape_type: The shape type, e.g. ``Part::Box``.
+    :param apply_placement: Whether the ``Placement`` parameter is applied
+        to the returned shape.
+    """
+
+    def decorator(func: OperatorFunc) -> OperatorFunc:
+        _OPERATORS[shape_type] = _Operator(func, apply_placement)
+        return func
+
+    return decorator
+
+
+def has_operator(shape_type: str) -> bool:
+    return shape_type in _OPERATORS
+
+
+def applies_placement(shape_type: str) -> bool:
+    """
+    Whether the ``Placement`` parameter of a shape type is applied on top of
+    the shape built by its operator.
+    """
+    operator = _OPERATORS.get(shape_type)
+    return operator is not None and operator.apply_placement
+
+
+def build_shape(
+    shape_type: str,
+    parameters: Any,
+    shapes: Dict[str, Any],
+    options: Optional[EngineOptions] = None,
+    placed: bool = True,
+) -> Optional[Any]:
+    """
+    Build the shape of an object.
+
+    :param shape_type: The shape type of the object.
+    :param parameters: The parameters of the object, as a pydantic model.
+    :param shapes: The shapes of the objects it may reference, by name.
+    :param options: The engine options, :data:`DEFAULT_ENGINE_OPTIONS` by default.
+    :param placed: Whether to apply the ``Placement`` parameter. If False, it
+        can be applied later with :func:`place_shape`.
+    :return: The shape, or None if the operator failed.
+    :raises KeyError: If no operator is registered for the shape type.
+    """
+    operator = _OPERATORS[shape_type]
+    shape = operator.func(parameters, shapes, options or DEFAULT_ENGINE_OPTIONS)
+    return place_shape(shape_type, parameters, shape) if placed else shape
+
+
+def place_shape(
+    shape_type: str, parameters: Any, shape: Optional[Any]
+) -> Optional[Any]:
+    """
+    Apply the ``Placement`` parameter to a shape built with ``placed=False``.
+    """
+    if shape is None or not applies_placement(shape_type):
+        return shape
+    placement = getattr(parameters, "Placement", None)
+    return apply_placement(shape, placement) if placement is not None else shape
+
+
+def apply_placement(shape, placement):
+    """
+    Apply a JupyterCAD placement (rotation around the origin, then translation).
+
+    The placement is stored as the location of the shape, which shares its
+    geometry with the unplaced shape instead of copying it.
+    """
+    from OCC.Core.TopLoc import TopLoc_Location
+    from OCC.Core.gp import gp_Ax1, gp_Dir, gp_Identity, gp_Pnt, gp_Trsf, gp_Vec
+
+    pos = placement.Position  # [x, y, z]
+    axis = placement.Axis  # [x, y, z]
+    angle = placement.Angle  # degrees
+
+    trsf = gp_Trsf()
+    # 1. Rotation (around Origin)
+    if axis and (axis[0] != 0 or axis[1] != 0 or axis[2] != 0):
+        occ_axis = gp_Ax1(gp_Pnt(0, 0, 0), gp_Dir(axis[0], axis[1], axis[2]))
+        trsf.SetRotation(occ_axis, math.radians(angle))
+    # 2. Translation (Move the rotated shape to position)
+    if pos:
+        trsf.SetTranslationPart(gp_Vec(pos[0], pos[1], pos[2]))
+
+    if trsf.Form() == gp_Identity:
+        return shape
+    return shape.Moved(TopLoc_Location(trsf))
+
+
+def apply_refine(shape):
+    """
+    Merge the faces and edges lying on the same surface or curve.
+    """
+    from OCC.Core.ShapeUpgrade import ShapeUpgrade_UnifySameDomain
+
+    unif = ShapeUpgrade_UnifySameDomain(shape, True, True, False)
+    unif.Build()
+    return unif.Shape()
+
+
+def get_any_type(params) -> str:
+    """
+    Get the lower-cased ``Type`` of ``Part::Any`` parameters.
+    """
+    for field_name, field in type(params).model_fields.items():
+        if (field.alias or field_name) == "Type":
+            value = getattr(params, field_name)
+            return str(getattr(value, "value", value)).lower()
+    return ""
+
+
+def shape_to_brep(shape) -> str:
+    """
+    Serialize an OpenCascade shape to the BRep text format used by ``Part::Any``.
+    """
+    from OCC.Core.BRepTools import breptools
+
+    with tempfile.NamedTemporaryFile() as tmp:
+        breptools.Write(shape, tmp.name, True, False, 1)
+        return tmp.read().decode("ascii")
+
+
+def brep_to_shape(content: str):
+    """
+    Read an OpenCascade shape from BRep text.
+    """
+    from OCC.Core.BRep import BRep_Builder
+    from OCC.Core.BRepTools import breptools
+    from OCC.Core.TopoDS import TopoDS_Shape
+
+    shape = TopoDS_Shape()
+    with tempfile.NamedTemporaryFile(suffix=".brep") as tmp:
+        tmp.write(content.encode("ascii"))
+        tmp.flush()
+        breptools.Read(shape, tmp.name, BRep_Builder())
+    return None if shape.IsNull() else shape
+
+
+def step_to_shape(content: str):
+    """
+    Read an OpenCascade shape from STEP text.
+    """
+    from OCC.Core.IFSelect import IFSelect_RetDone
+    from OCC.Core.STEPControl import STEPControl_Reader
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "shape.step")
+        with open(path, "w") as f:
+            f.write(content)
+        reader = STEPControl_Reader()
+        if reader.ReadFile(path) != IFSelect_RetDone:
+            logger.error("Could not read STEP content")
+            return None
+        reader.TransferRoots()
+        shape = reader.OneShape()
+    return None if shape.IsNull() else shape
+
+
+def stl_to_shape(content: str):
+    """
+    Read an OpenCascade shape, made of one face per triangle, from STL text.
+    """
+    from OCC.Core.StlAPI import StlAPI_Reader
+    from OCC.Core.TopoDS import TopoDS_Shape
+
+    shape = TopoDS_Shape()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "shape.stl")
+        with open(path, "w") as f:
+            f.write(content)
+        StlAPI_Reader().Read(shape, path)
+    return None if shape.IsNull() else shape
+
+
+_FILE_READERS = {
+    "brep": brep_to_shape,
+    "step": step_to_shape,
+    "stl": stl_to_shape,
+}
+
+
+def _get_edges(shape, indices) -> List[Any]:
+    """
+    Get edges by their index in the edge map of a shape, as in the frontend.
+    """
+    from OCC.Core.TopAbs import TopAbs_EDGE
+    from OCC.Core.TopExp import topexp
+    from OCC.Core.TopoDS import topods
+    from OCC.Core.TopTools import TopTools_IndexedMapOfShape
+
+    edge_map = TopTools_IndexedMapOfShape()
+    topexp.MapShapes(shape, TopAbs_EDGE, edge_map)
+    indices = indices if isinstance(indices, list) else [indices]
+    return [topods.Edge(edge_map.FindKey(int(index) + 1)) for index in indices]
+
+
+def _shape_list(shapes: List[Any]):
+    from OCC.Core.TopTools import TopTools_ListOfShape
+
+    shape_list = TopTools_ListOfShape()
+    for shape in shapes:
+        shape_list.Append(shape)
+    return shape_list
+
+
+_pool_threads: Optional[int] = None
+
+
+def _set_threads(threads: Optional[int]) -> None:
+    """
+    Resize the OpenCascade thread pool used by the parallel algorithms.
+    """
+    global _pool_threads
+    if threads is None or threads == _pool_threads:
+        return
+    from OCC.Core.OSD import OSD_ThreadPool
+
+    OSD_ThreadPool.DefaultPool().Init(threads)
+    _pool_threads = threads
+
+
+def _configure(algo, options: EngineOptions) -> None:
+    # [关键修复] 设置模糊容差，解决重合面切割失败的问题
+    algo.SetFuzzyValue(FUZZY_VALUE)
+    # The fuzzy mode may enlarge the tolerances of the operands' sub-shapes,
+    # the non-destructive mode copies only those instead of the operands.
+    algo.SetNonDestructive(True)
+    if options.parallel_booleans:
+        _set_threads(options.threads)
+    algo.SetRunParallel(options.parallel_booleans)
+
+
+def mesh_shape(
+    shape,
+    linear_deflection: float,
+    options: Optional[EngineOptions] = None,
+    angular_deflection: float = 0.5,
+) -> None:
+    """
+    Triangulate the faces of a shape in place.
+
+    An existing triangulation is replaced, even if it is finer.
+    """
+    from OCC.Core.BRepMesh import BRepMesh_IncrementalMesh
+    from OCC.Core.BRepTools import breptools
+
+    options = options or DEFAULT_ENGINE_OPTIONS
+    breptools.Clean(shape)
+    if options.parallel_meshing:
+        _set_threads(options.threads)
+    mesh = BRepMesh_IncrementalMesh(
+        shape, linear_deflection, False, angular_deflection, options.parallel_meshing
+    )
+    mesh.Perform()
+
+
+def copy_shape(shape):
+    """
+    Copy the topology of a shape, sharing its geometry.
+
+    Meshing the copy leaves the original free of triangulation, so that
+    shapes kept in caches are never modified.
+    """
+    from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Copy
+    from OCC.Core.TopLoc import TopLoc_Location
+
+    unplaced = shape.Located(TopLoc_Location())
+    return BRepBuilderAPI_Copy(unplaced, False, False).Shape().Located(shape.Location())
+
+
+def linear_deflection(shape, quality: MeshQuality) -> float:
+    """
+    Get the linear deflection of a shape for a mesh quality.
+    """
+    box = _bounding_box(shape)
+    if box.IsVoid():
+        return FUZZY_VALUE
+    diagonal = box.CornerMin().Distance(box.CornerMax())
+    return max(diagonal * quality.relative_deflection, FUZZY_VALUE)
+
+
+def mesh_shape_adaptive(
+    shape, quality: MeshQuality, options: Optional[EngineOptions] = None
+) -> None:
+    """
+    Triangulate the faces of a shape in place, with a deflection relative to its size.
+    """
+    mesh_shape(
+        shape, linear_deflection(shape, quality), options, quality.angular_deflection
+    )
+
+
+def _run_boolean(
+    algo_class, arguments: List[Any], tools: List[Any], options: EngineOptions
+):
+    algo = algo_class()
+    algo.SetArguments(_shape_list(arguments))
+    algo.SetTools(_shape_list(tools))
+    _configure(algo, options)
+    algo.Build()
+    return algo.Shape() if algo.IsDone() else None
+
+
+def _common_all(shapes: List[Any], options: EngineOptions):
+    """
+    Intersect all the shapes at once.
+
+    A boolean common with several tools keeps what is inside any of them, so
+    the cells builder is used to keep the parts inside every shape.
+    """
+    from OCC.Core.BOPAlgo import BOPAlgo_CellsBuilder
+
+    arguments = _shape_list(shapes)
+    builder = BOPAlgo_CellsBuilder()
+    builder.SetArguments(arguments)
+    _configure(builder, options)
+    builder.Perform()
+    if builder.HasErrors():
+        return None
+    builder.AddToResult(arguments, _shape_list([]))
+    builder.RemoveInternalBoundaries()
+    return builder.Shape()
+
+
+def _reduce_balanced(algo_class, shapes: List[Any], options: EngineOptions):
+    while len(shapes) > 1:
+        reduced = []
+        for i in range(0, len(shapes) - 1, 2):
+            result = _run_boolean(algo_class, [shapes[i]], [shapes[i + 1]], options)
+            if result is None:
+                return None
+            reduced.append(result)
+        if len(shapes) % 2:
+            reduced.append(shapes[-1])
+        shapes = reduced
+    return shapes[0]
+
+
+class ShortCircuitInfo(NamedTuple):
+    """
+    Number of booleans skipped because their operands do not overlap.
+    """
+
+    cut: int
+    fuse: int
+    common: int
+
+
+_short_circuits = {"cut": 0, "fuse": 0, "common": 0}
+
+
+def short_circuit_info() -> ShortCircuitInfo:
+    """
+    Get the number of booleans skipped by the bounding box checks of this process.
+    """
+    return ShortCircuitInfo(**_short_circuits)
+
+
+def reset_short_circuit_info() -> None:
+    for key in _short_circuits:
+        _short_circuits[key] = 0
+
+
+def _bounding_box(shape):
+    from OCC.Core.Bnd import Bnd_Box
+    from OCC.Core.BRepBndLib import brepbndlib
+
+    box = Bnd_Box()
+    brepbndlib.Add(shape, box, False)
+    # Shapes closer than the fuzzy value are glued by the booleans.
+    box.Enlarge(FUZZY_VALUE)
+    return box
+
+
+def _isolated(boxes: List[Any]) -> List[bool]:
+    """
+    Tell, for each bounding box, whether it is disjoint from all the others.
+    """
+    isolated = [True] * len(boxes)
+    for i in range(len(boxes)):
+        for j in range(i + 1, len(boxes)):
+            if not boxes[i].IsOut(boxes[j]):
+                isolated[i] = isolated[j] = False
+    return isolated
+
+
+def _any_disjoint(boxes: List[Any]) -> bool:
+    return any(
+        boxes[i].IsOut(boxes[j])
+        for i in range(len(boxes))
+        for j in range(i + 1, len(boxes))
+    )
+
+
+def _make_compound(shapes: List[Any]):
+    from OCC.Core.BRep import BRep_Builder
+    from OCC.Core.TopoDS import TopoDS_Compound
+
+    builder = BRep_Builder()
+    compound = TopoDS_Compound()
+    builder.MakeCompound(compound)
+    for shape in shapes:
+        builder.Add(compound, shape)
+    return compound
+
+
+@register_operator("Part::Box")
+def _box(params, shapes, options):
+    from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeBox
+
+    return BRepPrimAPI_MakeBox(params.Length, params.Width, params.Height).Shape()
+
+
+@register_operator("Part::Cylinder")
+def _cylinder(params, shapes, options):
+    from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeCylinder
+
+    return BRepPrimAPI_MakeCylinder(
+        params.Radius, params.Height, math.radians(params.Angle)
+    ).Shape()
+
+
+@register_operator("Part::Sphere")
+def _sphere(params, shapes, options):
+    from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeSphere
+
+    return BRepPrimAPI_MakeSphere(
+        params.Radius,
+        math.radians(params.Angle1),
+        math.radians(params.Angle2),
+        math.radians(params.Angle3),
+    ).Shape()
+
+
+@register_operator("Part::Cone")
+def _cone(params, shapes, options):
+    from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeCone
+
+    return BRepPrimAPI_MakeCone(
+        params.Radius1, params.Radius2, params.Height, math.radians(params.Angle)
+    ).Shape()
+
+
+@register_operator("Part::Torus")
+def _torus(params, shapes, options):
+    from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeTorus
+
+    return BRepPrimAPI_MakeTorus(
+        params.Radius1,
+        params.Radius2,
+        math.radians(params.Angle1),
+        math.radians(params.Angle2),
+        math.radians(params.Angle3),
+    ).Shape()
+
+
+@register_operator("Part::Any")
+def _any(params, shapes, options):
+    file_type = get_any_type(params)
+    reader = _FILE_READERS.get(file_type)
+    if reader is None:
+        logger.error(f"{file_type} files are not supported")
+        return None
+    return reader(params.Content)
+
+
+@register_operator("Part::Cut")
+def _cut(params, shapes, options):
+    from OCC.Core.BRepAlgoAPI import BRepAlgoAPI_Cut
+
+    base = shapes.get(params.Base)
+    tool = shapes.get(params.Tool)
+    if not base or not tool:
+        return None
+
+    if options.bounding_box_checks and _bounding_box(base).IsOut(_bounding_box(tool)):
+        _short_circuits["cut"] += 1
+        return base
+
+    shape = _run_boolean(BRepAlgoAPI_Cut, [base], [tool], options)
+    if shape is None:
+        logger.warning(f"Cut of {params.Base} by {params.Tool} failed")
+    return shape
+
+
+def _fuse_all(shapes: List[Any], options: EngineOptions):
+    from OCC.Core.BRepAlgoAPI import BRepAlgoAPI_Fuse
+
+    if options.nary_strategy is NaryStrategy.BALANCED:
+        return _reduce_balanced(BRepAlgoAPI_Fuse, shapes, options)
+    return _run_boolean(BRepAlgoAPI_Fuse, shapes[:1], shapes[1:], options)
+
+
+@register_operator("Part::MultiFuse")
+def _fuse(params, shapes, options):
+    valid_shapes = [shapes.get(s) for s in params.Shapes if shapes.get(s)]
+    if len(valid_shapes) < 2:
+        return None
+
+    isolated = [False] * len(valid_shapes)
+    if options.bounding_box_checks:
+        isolated = _isolated([_bounding_box(shape) for shape in valid_shapes])
+    if any(isolated):
+        # Disjoint shapes are left out of the fuse and only gathered with
+        # the fused remaining shapes.
+        _short_circuits["fuse"] += 1
+        parts = [shape for shape, alone in zip(valid_shapes, isolated) if alone]
+        overlapping = [
+            shape for shape, alone in zip(valid_shapes, isolated) if not alone
+        ]
+        fused = _fuse_all(overlapping, options) if overlapping else None
+        if overlapping and fused is None:
+            shape = None
+        else:
+            shape = _make_compound(parts if fused is None else parts + [fused])
+    else:
+        shape = _fuse_all(valid_shapes, options)
+    if shape is None:
+        logger.warning(f"Fuse of {', '.join(params.Shapes)} failed")
+    return shape
+
+
+@register_operator("Part::MultiCommon")
+def _common(params, shapes, options):
+    from OCC.Core.BRepAlgoAPI import BRepAlgoAPI_Common
+
+    valid_shapes = [shapes.get(s) for s in params.Shapes if shapes.get(s)]
+    if len(valid_shapes) < 2:
+        return None
+
+    if options.bounding_box_checks and _any_disjoint(
+        [_bounding_box(shape) for shape in valid_shapes]
+    ):
+        # A shape disjoint from another one leaves nothing in common.
+        _short_circuits["common"] += 1
+        return _make_compound([])
+    if options.nary_strategy is NaryStrategy.BALANCED:
+        shape = _reduce_balanced(BRepAlgoAPI_Common, valid_shapes, options)
+    else:
+        shape = _common_all(valid_shapes, options)
+    if shape is None:
+        logger.warning(f"Common of {', '.join(params.Shapes)} failed")
+    return shape
+
+
+@register_operator("Part::Extrusion")
+def _extrusion(params, shapes, options):
+    from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_MakeFace, BRepBuilderAPI_MakeWire
+    from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakePrism
+    from OCC.Core.TopAbs import TopAbs_EDGE, TopAbs_FACE
+    from OCC.Core.TopExp import TopExp_Explorer
+    from OCC.Core.TopLoc import TopLoc_Location
+    from OCC.Core.TopoDS import topods
+    from OCC.Core.gp import gp_Trsf, gp_Vec
+
+    base = shapes.get(params.Base)
+    if not base:
+        return None
+
+    direction = gp_Vec(*params.Dir)
+    if params.LengthRev != 0:
+        trsf = gp_Trsf()
+        trsf.SetTranslation(direction.Multiplied(-params.LengthRev))
+        base = base.Moved(TopLoc_Location(trsf))
+
+    # A solid can only be extruded from faces: close the edges into one.
+    if params.Solid and not TopExp_Explorer(base, TopAbs_FACE).More():
+        wire_maker = BRepBuilderAPI_MakeWire()
+        explorer = TopExp_Explorer(base, TopAbs_EDGE)
+        while explorer.More():
+            wire_maker.Add(topods.Edge(explorer.Current()))
+            explorer.Next()
+        base = BRepBuilderAPI_MakeFace(wire_maker.Wire(), False).Face()
+
+    vector = direction.Multiplied(params.LengthFwd + params.LengthRev)
+    return BRepPrimAPI_MakePrism(base, vector, False, True).Shape()
+
+
+@register_operator("Part::Chamfer")
+def _chamfer(params, shapes, options):
+    from OCC.Core.BRepFilletAPI import BRepFilletAPI_MakeChamfer
+
+    base = shapes.get(params.Base)
+    if not base:
+        return None
+    builder = BRepFilletAPI_MakeChamfer(base)
+    for edge in _get_edges(base, params.Edge):
+        builder.Add(params.Dist, edge)
+    builder.Build()
+    if not builder.IsDone():
+        logger.warning(f"Chamfer of {params.Base} failed")
+        return None
+    return builder.Shape()
+
+
+@register_operator("Part::Fillet")
+def _fillet(params, shapes, options):
+    from OCC.Core.BRepFilletAPI import BRepFilletAPI_MakeFillet
+
+    base = shapes.get(params.Base)
+    if not base:
+        return None
+    builder = BRepFilletAPI_MakeFillet(base)
+    for edge in _get_edges(base, params.Edge):
+        builder.Add(params.Radius, edge)
+    builder.Build()
+    if not builder.IsDone():
+        logger.warning(f"Fillet of {params.Base} failed")
+        return None
+    return builder.Shape()
+
+
+# The sketch geometry is already expressed in the global frame.
+@register_operator("Sketcher::SketchObject", apply_placement=False)
+def _sketch(params, shapes, options):
+    from OCC.Core.BRep import BRep_Builder
+    from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_MakeEdge, BRepBuilderAPI_MakeWire
+    from OCC.Core.GC import GC_MakeCircle
+    from OCC.Core.TopoDS import TopoDS_Compound
+    from OCC.Core.gp import gp_Dir, gp_Pnt
+
+    if not params.Geometry:
+        return None
+    builder = BRep_Builder()
+    compound = TopoDS_Compound()
+    builder.MakeCompound(compound)
+    for geometry in params.Geometry:
+        if geometry.TypeId == "Part::GeomCircle":
+            circle = GC_MakeCircle(
+                gp_Pnt(geometry.CenterX, geometry.CenterY, geometry.CenterZ),
+                gp_Dir(geometry.NormalX, geometry.NormalY, geometry.NormalZ),
+                geometry.Radius,
+            ).Value()
+            edge = BRepBuilderAPI_MakeEdge(circle.Circ()).Edge()
+        elif geometry.TypeId == "Part::GeomLineSegment":
+            edge = BRepBuilderAPI_MakeEdge(
+                gp_Pnt(geometry.StartX, geometry.StartY, geometry.StartZ),
+                gp_Pnt(geometry.EndX, geometry.EndY, geometry.EndZ),
+            ).Edge()
+        else:
+            continue
+        builder.Add(compound, BRepBuilderAPI_MakeWire(edge).Wire())
+    return compound
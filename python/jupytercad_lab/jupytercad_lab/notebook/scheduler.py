@@ -0,0 +1,211 @@
+"""
+Parallel reconstruction and meshing of the objects of a document.
+
+OpenCascade boolean operations are CPU-bound and hold the GIL, so
+independent branches of the dependency graph are reconstructed in separate
+processes. An object is submitted as soon as the objects it is built from
+are available, and shapes travel between processes as binary BRep. Workers
+return shapes without their placement, which is applied as a location in
+the parent process.
+
+Meshing is fanned out the same way, one shape per task, and the
+triangulated shapes are sent back with their triangulation.
+
+Workers are spawned rather than forked, as the parent is usually a Jupyter
+kernel with threads of its own. A task that fails in a worker, including
+when the pool breaks, is run again in the parent process.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+from collections import ChainMap
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    as_completed,
+    wait,
+)
+from typing import Any, Dict, List, Mapping, Optional
+
+from .operators import EngineOptions, MeshQuality, copy_shape, mesh_shape_adaptive
+from .shape_cache import shape_from_bytes, shape_to_bytes
+
+logger = logging.getLogger(__file__)
+
+
+def _build(
+    data: Dict, shapes: Mapping[str, Any], options: Optional[EngineOptions]
+) -> Optional[Any]:
+    from .cad_document import OBJECT_FACTORY, CadDocument
+
+    obj = OBJECT_FACTORY.create_object(data)
+    if obj is None:
+        return None
+    return CadDocument._build_occ_shape(obj, shapes, options, placed=False)
+
+
+def _build_in_worker(
+    data: Dict, operands: Dict[str, bytes], options: Optional[EngineOptions]
+) -> Optional[bytes]:
+    shapes = {name: shape_from_bytes(content) for name, content in operands.items()}
+    shape = _build(data, shapes, options)
+    return shape_to_bytes(shape) if shape else None
+
+
+def _place(data: Dict, shape: Any) -> Optional[Any]:
+    from .cad_document import OBJECT_FACTORY, CadDocument
+
+    return CadDocument._place_occ_shape(OBJECT_FACTORY.create_object(data), shape)
+
+
+def build_shapes_in_processes(
+    objects: Dict[str, Dict],
+    dependencies: Dict[str, List[str]],
+    shapes: Dict[str, Any],
+    max_workers: int,
+    options: Optional[EngineOptions] = None,
+) -> Dict[str, Any]:
+    """
+    Reconstruct objects in a pool of processes, following their dependencies.
+
+    :param objects: The data of the objects to reconstruct, by name, each
+        after the objects it is built from.
+    :param dependencies: The names of the objects each object is built from.
+    :param shapes: The shapes already available, by name.
+    :param max_workers: The number of processes.
+    :param options: The options of the operators.
+    :return: The reconstructed shapes before their placement, by name.
+        Objects that could not be reconstructed are left out. Objects that
+        failed in a worker, and the objects built from them, are
+        reconstructed in this process.
+    """
+    encoded: Dict[str, bytes] = {}
+    # The placed shapes, operands of the next objects.
+    placed: Dict[str, Any] = {}
+    results: Dict[str, Any] = {}
+    # The objects a worker returned a result for, even an empty one.
+    finished = set()
+    waiting = {
+        name: {dep for dep in dependencies.get(name, ()) if dep in objects}
+        for name in objects
+    }
+    dependents: Dict[str, List[str]] = {}
+    for name, deps in waiting.items():
+        for dep in deps:
+            dependents.setdefault(dep, []).append(name)
+
+    def operands(name: str) -> Dict[str, bytes]:
+        found = {}
+        for dep in dependencies.get(name, ()):
+            if dep not in encoded:
+                shape = placed.get(dep, shapes.get(dep))
+                if shape is None:
+                    continue
+                encoded[dep] = shape_to_bytes(shape)
+            found[dep] = encoded[dep]
+        return found
+
+    def store(name: str, shape: Optional[Any]) -> None:
+        if not shape:
+            return
+        results[name] = shape
+        shape = _place(objects[name], shape)
+        if shape is not None:
+            placed[name] = shape
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+        running: Dict[Future, str] = {}
+
+        def submit_ready(names) -> None:
+            for name in names:
+                if waiting[name]:
+                    continue
+                try:
+                    future = executor.submit(
+                        _build_in_worker, objects[name], operands(name), options
+                    )
+                except Exception as e:
+                    logger.warning(f"Could not submit {name} to a worker: {e}")
+                    continue
+                running[future] = name
+
+        submit_ready(list(waiting))
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    content = future.result()
+                except Exception as e:
+                    logger.warning(f"Could not build {name} in a worker: {e}")
+                    continue
+                finished.add(name)
+                if content is not None:
+                    store(name, shape_from_bytes(content))
+                ready = []
+                for dependent in dependents.get(name, ()):
+                    waiting[dependent].discard(name)
+                    ready.append(dependent)
+                submit_ready(ready)
+
+    available = ChainMap(placed, shapes)
+    for name in objects:
+        if name not in finished:
+            store(name, _build(objects[name], available, options))
+    return results
+
+
+def _mesh_in_worker(
+    content: bytes, quality: MeshQuality, options: Optional[EngineOptions]
+) -> bytes:
+    shape = shape_from_bytes(content)
+    mesh_shape_adaptive(shape, quality, options)
+    return shape_to_bytes(shape)
+
+
+def mesh_shapes_in_processes(
+    shapes: Dict[str, Any],
+    quality: MeshQuality,
+    max_workers: int,
+    options: Optional[EngineOptions] = None,
+) -> Dict[str, Any]:
+    """
+    Triangulate shapes in a pool of processes.
+
+    :param shapes: The shapes to mesh, by name. They are not modified.
+    :param quality: The mesh quality, relative to the size of each shape.
+    :param max_workers: The number of processes.
+    :param options: The engine options, for parallel meshing within a shape.
+    :return: Triangulated copies of the shapes, by name. A shape that could
+        not be meshed in a worker is copied and meshed in this process.
+    """
+    encoded = {name: shape_to_bytes(shape) for name, shape in shapes.items()}
+    meshed: Dict[str, Any] = {}
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+        futures: Dict[Future, str] = {}
+        # The largest shapes first, so that they do not finish last.
+        for name in sorted(encoded, key=lambda name: -len(encoded[name])):
+            try:
+                future = executor.submit(
+                    _mesh_in_worker, encoded[name], quality, options
+                )
+            except Exception as e:
+                logger.warning(f"Could not submit {name} to a worker: {e}")
+                break
+            futures[future] = name
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                meshed[name] = shape_from_bytes(future.result())
+            except Exception as e:
+                logger.warning(f"Could not mesh {name} in a worker: {e}")
+    for name, shape in shapes.items():
+        if meshed.get(name) is None:
+            meshed[name] = copy_shape(shape)
+            mesh_shape_adaptive(meshed[name], quality, options)
+    return meshed
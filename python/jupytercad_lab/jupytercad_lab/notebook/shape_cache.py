@@ -0,0 +1,293 @@
+"""
+Content-addressed cache of reconstructed OpenCascade shapes.
+
+Shapes are keyed by a hash of the parameters of an object and of the keys
+of the objects it is built from, the way ``operatorCache.ts`` keys shapes by
+their expanded operator tree in the frontend. Object names are not part of
+the key, so renaming an object or loading the same assembly in another
+document hits the cache.
+
+The cache keeps recently used shapes in memory and, when given a directory,
+persists them as binary BRep files so that they survive the session. The
+least recently used files are removed once the directory exceeds its size
+budget.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__file__)
+
+# Bump when the reconstruction of a shape from its parameters changes, so
+# that shapes stored by an older version are not reused.
+SHAPE_KEY_VERSION = 4
+
+# Parameters that only affect the rendering of a shape.
+_NON_GEOMETRIC_PARAMETERS = {"Color"}
+# Parameters referencing other objects by name, replaced by their keys.
+_REFERENCE_PARAMETERS = {"Base", "Tool", "Shapes"}
+# Engine options that change the resulting shape, not only how fast it is built.
+_GEOMETRIC_OPTIONS = ("nary_strategy", "bounding_box_checks")
+
+DEFAULT_MAX_DISK_BYTES = 1 << 30
+
+
+class ShapeCacheInfo(NamedTuple):
+    """
+    Statistics of a :class:`ShapeCache`.
+    """
+
+    hits: int
+    misses: int
+    size: int
+
+
+def shape_key(
+    shape_type: str,
+    parameters: Dict,
+    dependency_keys: Iterable[str],
+    options: Optional[Any] = None,
+) -> str:
+    """
+    Compute the cache key of a shape.
+
+    :param shape_type: The shape type, e.g. ``Part::Cut``.
+    :param parameters: The parameters of the object, as stored in the document.
+    :param dependency_keys: The keys of the objects it references, in the
+        order of its ``Base``, ``Tool`` and ``Shapes`` parameters.
+    :param options: The ``EngineOptions`` the shape is built with. Only the
+        options changing the result, such as the n-ary strategy, are part of
+        the key.
+    """
+    own = {
+        key: value
+        for key, value in parameters.items()
+        if key not in _NON_GEOMETRIC_PARAMETERS and key not in _REFERENCE_PARAMETERS
+    }
+    digest = hashlib.sha256()
+    digest.update(f"{SHAPE_KEY_VERSION}\0{shape_type}\0".encode())
+    digest.update(json.dumps(own, sort_keys=True, default=str).encode())
+    if options is not None:
+        settings = {name: getattr(options, name) for name in _GEOMETRIC_OPTIONS}
+        digest.update(b"\0")
+        digest.update(json.dumps(settings, sort_keys=True, default=str).encode())
+    for key in dependency_keys:
+        digest.update(b"\0")
+        digest.update(key.encode())
+    return digest.hexdigest()
+
+
+class ShapeCache:
+    """
+    Store of OpenCascade shapes by :func:`shape_key`.
+
+    :param directory: Where to persist the shapes as binary BRep files. If
+        not provided, shapes are only kept in memory.
+    :param max_memory_entries: How many shapes to keep in memory.
+    :param max_disk_bytes: How many bytes of shapes to keep on disk. The least
+        recently used files are removed beyond that.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str | Path] = None,
+        max_memory_entries: int = 256,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+    ):
+        self._directory = Path(directory).expanduser() if directory else None
+        self._max_memory_entries = max_memory_entries
+        self._max_disk_bytes = max_disk_bytes
+        # Size of the files on disk, computed on the first write.
+        self._disk_bytes: Optional[int] = None
+        self._memory: OrderedDict[str, Any] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def directory(self) -> Optional[Path]:
+        return self._directory
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get a shape, or None if it is not in the cache.
+        """
+        shape = self._memory.get(key)
+        if shape is not None:
+            self._memory.move_to_end(key)
+        else:
+            shape = self._read(key)
+            if shape is not None:
+                self._remember(key, shape)
+        if shape is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return shape
+
+    def put(self, key: str, shape: Any) -> None:
+        """
+        Add a shape to the cache.
+        """
+        self._remember(key, shape)
+        self._write(key, shape)
+
+    def __contains__(self, key: str) -> bool:
+        if key in self._memory:
+            return True
+        path = self._path(key)
+        return path is not None and path.exists()
+
+    def clear(self) -> None:
+        """
+        Remove all the shapes, including the ones stored on disk.
+        """
+        self._memory.clear()
+        if self._directory is not None and self._directory.exists():
+            for path in self._directory.glob("*/*.bin"):
+                path.unlink(missing_ok=True)
+        self._disk_bytes = None
+
+    def info(self) -> ShapeCacheInfo:
+        """
+        Get the hit and miss counts of the cache and the number of shapes in memory.
+        """
+        return ShapeCacheInfo(self._hits, self._misses, len(self._memory))
+
+    def _remember(self, key: str, shape: Any) -> None:
+        self._memory[key] = shape
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> Optional[Path]:
+        if self._directory is None:
+            return None
+        return self._directory / key[:2] / f"{key}.bin"
+
+    def _read(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        if path is None or not path.exists():
+            return None
+        try:
+            from OCC.Core.BinTools import bintools
+            from OCC.Core.TopoDS import TopoDS_Shape
+
+            shape = TopoDS_Shape()
+            bintools.Read(shape, str(path))
+            # The modification time orders the files for eviction.
+            os.utime(path)
+        except Exception as e:
+            logger.warning(f"Could not read cached shape {path}: {e}")
+            return None
+        return None if shape.IsNull() else shape
+
+    def _write(self, key: str, shape: Any) -> None:
+        path = self._path(key)
+        if path is None or path.exists():
+            return
+        try:
+            from OCC.Core.BinTools import bintools
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write next to the destination and rename, so that concurrent
+            # readers never see a partial file.
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            os.close(fd)
+            try:
+                bintools.Write(shape, tmp_name)
+                os.replace(tmp_name, path)
+            finally:
+                if os.path.exists(tmp_name):
+                    os.unlink(tmp_name)
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+            else:
+                self._disk_bytes += path.stat().st_size
+            if self._disk_bytes > self._max_disk_bytes:
+                self._evict()
+        except Exception as e:
+            logger.warning(f"Could not store shape {key} in {self._directory}: {e}")
+
+    def _disk_files(self) -> List[Tuple[float, int, Path]]:
+        files = []
+        for path in self._directory.glob("*/*.bin"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _evict(self) -> None:
+        """
+        Remove the least recently used files until the cache is within 90% of
+        its budget, so that the directory is not scanned on every write.
+        """
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        target = self._max_disk_bytes * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self._disk_bytes = total
+
+
+def shape_to_bytes(shape: Any) -> bytes:
+    """
+    Serialize an OpenCascade shape to binary BRep, with its triangulation.
+    """
+    from OCC.Core.BinTools import bintools
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "shape.bin")
+        bintools.Write(shape, path)
+        with open(path, "rb") as f:
+            return f.read()
+
+
+def shape_from_bytes(data: bytes) -> Optional[Any]:
+    """
+    Read an OpenCascade shape from binary BRep.
+    """
+    from OCC.Core.BinTools import bintools
+    from OCC.Core.TopoDS import TopoDS_Shape
+
+    shape = TopoDS_Shape()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "shape.bin")
+        with open(path, "wb") as f:
+            f.write(data)
+        bintools.Read(shape, path)
+    return None if shape.IsNull() else shape
+
+
+_default_cache: Optional[ShapeCache] = None
+
+
+def default_shape_cache() -> ShapeCache:
+    """
+    Get the shape cache shared by the documents of this process.
+
+    Shapes are stored in the directory given by the ``JUPYTERCAD_SHAPE_CACHE``
+    environment variable, ``~/.cache/jupytercad/shapes`` by default, up to
+    :data:`DEFAULT_MAX_DISK_BYTES`. Setting the variable to an empty string
+    keeps the shapes in memory only.
+    """
+    global _default_cache
+    if _default_cache is None:
+        directory = os.environ.get("JUPYTERCAD_SHAPE_CACHE")
+        if directory is None:
+            cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join("~", ".cache")
+            directory = os.path.join(cache_home, "jupytercad", "shapes")
+        _default_cache = ShapeCache(directory or None)
+    return _default_cache
@@ -0,0 +1,1613 @@
+"""
+Unit tests for the CadDocument notebook API.
+
+Tests cover:
+1. Name index consistency under local and remote edits
+2. Lightweight read-only object views
+"""
+
+import json
+import time
+
+import pytest
+
+pytest.importorskip("pycrdt")
+
+from pycrdt import Array, Doc, Map  # noqa: E402
+
+from jupytercad_lab.notebook.cad_document import (  # noqa: E402
+    CadDocument,
+    JcadObjectView,
+)
+
+
+def _scan_names(doc: CadDocument) -> list:
+    """Names as read directly from the Y array, bypassing the index."""
+    return [item["name"] for item in doc._objects_array]
+
+
+def _assert_index_consistent(doc: CadDocument) -> None:
+    names = _scan_names(doc)
+    assert doc.objects == names
+    assert len(doc._object_maps) == len(names)
+    for position, name in enumerate(names):
+        assert doc._get_yobject_index_by_name(name) == names.index(name)
+        assert doc._get_yobject_by_name(name)["name"] == name
+    assert len(doc._name_index) == len(set(names))
+
+
+@pytest.fixture(autouse=True)
+def shape_cache(tmp_path, monkeypatch):
+    """Keep the shapes built by the tests out of the user's cache directory."""
+    from jupytercad_lab.notebook import shape_cache as module
+
+    cache = module.ShapeCache(tmp_path / "shapes")
+    monkeypatch.setattr(module, "_default_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def document():
+    doc = CadDocument()
+    doc.add_box(name="a")
+    doc.add_box(name="b")
+    doc.add_cylinder(name="c")
+    return doc
+
+
+class TestNameIndex:
+    """Tests for the name -> index lookup table"""
+
+    def test_append(self, document):
+        assert document.objects == ["a", "b", "c"]
+        assert document.check_exist("b")
+        assert not document.check_exist("z")
+        _assert_index_consistent(document)
+
+    def test_remove_shifts_following_objects(self, document):
+        document.remove("a")
+        assert document._get_yobject_index_by_name("b") == 0
+        assert document._get_yobject_index_by_name("a") == -1
+        assert document._get_yobject_by_name("a") is None
+        _assert_index_consistent(document)
+
+    def test_rename(self, document):
+        document.rename("b", "renamed")
+        assert not document.check_exist("b")
+        assert document.check_exist("renamed")
+        _assert_index_consistent(document)
+
+    def test_name_change_inside_map(self, document):
+        document._get_yobject_by_name("c")["name"] = "d"
+        assert document.objects == ["a", "b", "d"]
+        _assert_index_consistent(document)
+
+    def test_insert_in_the_middle(self, document):
+        document._objects_array.insert(1, Map({"name": "mid", "shape": "Part::Box"}))
+        assert document.objects == ["a", "mid", "b", "c"]
+        _assert_index_consistent(document)
+
+    def test_remote_edits(self, document):
+        remote = Doc()
+        remote["objects"] = remote_objects = Array()
+        remote.apply_update(document.ydoc.get_update())
+
+        remote_objects.pop(0)
+        remote_objects.append(Map({"name": "remote", "shape": "Part::Box"}))
+        remote_objects[0]["name"] = "b2"
+        document.ydoc.apply_update(remote.get_update(document.ydoc.get_state()))
+
+        assert document.objects == ["b2", "c", "remote"]
+        _assert_index_consistent(document)
+
+    def test_import_from_file(self, document, tmp_path):
+        path = tmp_path / "doc.jcad"
+        path.write_text(
+            json.dumps(
+                {
+                    "objects": [
+                        {"name": name, "shape": "Part::Box", "parameters": {}}
+                        for name in ("x", "y", "z")
+                    ]
+                }
+            )
+        )
+        imported = CadDocument.import_from_file(path)
+        assert imported.objects == ["x", "y", "z"]
+        imported.remove("y")
+        _assert_index_consistent(imported)
+
+    def test_many_objects(self):
+        doc = CadDocument()
+        for _ in range(200):
+            doc.add_box()
+        assert len(doc.objects) == 200
+        _assert_index_consistent(doc)
+
+    def test_lookup_does_not_scale_with_size(self):
+        def lookup_time(count):
+            doc = CadDocument()
+            doc._objects_array.extend(
+                [Map({"name": f"box {i}", "shape": "Part::Box"}) for i in range(count)]
+            )
+            last = f"box {count - 1}"
+            start = time.perf_counter()
+            for _ in range(2000):
+                doc._get_yobject_by_name(last)
+            return time.perf_counter() - start
+
+        # Coarse on purpose: lookups walking the Y array grow with its length.
+        small = min(lookup_time(500) for _ in range(3))
+        large = min(lookup_time(8000) for _ in range(3))
+        assert large < small * 4
+
+
+class TestObjectView:
+    """Tests for the read-only object views"""
+
+    def test_view_matches_object(self, document):
+        view = document.get_object_view("c")
+        obj = document.get_object("c")
+        assert isinstance(view, JcadObjectView)
+        assert view.name == obj.name
+        assert view.shape == obj.shape
+        assert view.visible == obj.visible
+        assert view.parameters == obj.parameters
+        assert view.to_object(document) == obj
+
+    def test_missing_object(self, document):
+        assert document.get_object_view("missing") is None
+
+    def test_parameters_decoded_lazily(self, document):
+        view = document.get_object_view("a")
+        assert view._parameters is None
+        assert view.parameters.Length == 1
+        assert view._parameters is not None
+
+    def test_get_object_does_not_create_document(self, document, monkeypatch):
+        created = []
+        original_init = CadDocument.__init__
+
+        def tracking_init(self, *args, **kwargs):
+            created.append(self)
+            original_init(self, *args, **kwargs)
+
+        monkeypatch.setattr(CadDocument, "__init__", tracking_init)
+        document.get_object("a")
+        document.get_object_view("a").parameters
+        assert created == []
+
+
+class TestBatch:
+    """Tests for batched edits"""
+
+    def _count_updates(self, doc):
+        updates = []
+        subscription = doc.ydoc.observe(lambda event: updates.append(event.update))
+        return updates, subscription
+
+    def test_single_update(self, document):
+        updates, _subscription = self._count_updates(document)
+        with document.batch():
+            for _ in range(20):
+                document.add_box()
+            document.add_sphere(name="s")
+            document.cut(base="a", tool="s")
+        assert len(updates) == 1
+        assert document.check_exist("Cut 1")
+        assert document.get_object_view("a").visible is False
+        _assert_index_consistent(document)
+
+    def test_index_current_inside_batch(self, document):
+        with document.batch():
+            document.add_box(name="inner")
+            assert document.check_exist("inner")
+            assert document.objects[-1] == "inner"
+            document.remove("a")
+            assert not document.check_exist("a")
+            document.fuse(shape1="inner", shape2="b")
+        assert document.objects == ["b", "c", "inner", "Fuse 1"]
+        _assert_index_consistent(document)
+
+    def test_forward_reference(self, document):
+        with document.batch():
+            document.cut(name="later_cut", base="a", tool="later")
+            document.add_box(name="later")
+        assert document.get_object_view("later").visible is False
+        _assert_index_consistent(document)
+
+    def test_rollback_on_exception(self, document):
+        before = document._objects_array.to_py()
+        with pytest.raises(RuntimeError):
+            with document.batch():
+                document.add_box(name="x")
+                document.set_color("a", "#FF0000")
+                document.remove("b")
+                document.rename("c", "c2")
+                raise RuntimeError("boom")
+        assert document._objects_array.to_py() == before
+        _assert_index_consistent(document)
+
+    def test_validation_on_commit(self, document):
+        before = document._objects_array.to_py()
+        with pytest.raises(ValueError):
+            with document.batch():
+                document.cut(base="a", tool="missing")
+        assert document._objects_array.to_py() == before
+
+        with pytest.raises(ValueError):
+            with document.batch():
+                document.add_box(name="a")
+        assert document._objects_array.to_py() == before
+        _assert_index_consistent(document)
+
+    def test_existing_duplicate(self, document, tmp_path):
+        document._objects_array.append(
+            Map({"name": "a", "shape": "Part::Box", "parameters": {}})
+        )
+        assert document.objects == ["a", "b", "c", "a"]
+        with document.batch():
+            document.add_box(name="x")
+        document.rename("b", "b2")
+        document.save(tmp_path / "doc.jcad", extract_features=False)
+        assert document.objects == ["a", "b2", "c", "a", "x"]
+
+        with pytest.raises(ValueError, match="already exist"):
+            with document.batch():
+                document.add_box(name="x")
+        assert document.objects == ["a", "b2", "c", "a", "x"]
+
+    def test_nested_batch(self, document):
+        updates, _subscription = self._count_updates(document)
+        with document.batch():
+            document.add_box(name="x")
+            with document.batch():
+                document.add_box(name="y")
+        assert len(updates) == 1
+        assert document.objects[-2:] == ["x", "y"]
+
+
+class TestBulkPrimitives:
+    """Tests for the vectorized add_boxes/add_cylinders/add_spheres"""
+
+    def test_add_boxes_matches_add_box(self):
+        np = pytest.importorskip("numpy")
+        bulk = CadDocument()
+        bulk.add_boxes(
+            lengths=[1, 2],
+            widths=3,
+            heights=np.array([4.0, 5.0]),
+            colors=["#FF0000", "#00FF00"],
+            positions=[[0, 0, 0], [1, 2, 3]],
+            rotation_angles=[0, 45],
+        )
+        single = CadDocument()
+        single.add_box(length=1, width=3, height=4, color="#FF0000")
+        single.add_box(
+            length=2,
+            width=3,
+            height=5,
+            color="#00FF00",
+            position=[1, 2, 3],
+            rotation_angle=45,
+        )
+        assert bulk.objects == single.objects == ["Box 1", "Box 2"]
+        assert bulk._objects_array.to_py() == single._objects_array.to_py()
+        for name in bulk.objects:
+            assert (
+                bulk.get_object(name).model_dump()
+                == single.get_object(name).model_dump()
+            )
+
+    def test_add_cylinders_and_spheres(self):
+        np = pytest.importorskip("numpy")
+        doc = CadDocument()
+        positions = np.stack([np.arange(10), np.zeros(10), np.zeros(10)], axis=1)
+        doc.add_cylinders(radii=0.5, heights=2, positions=positions)
+        doc.add_spheres(radii=np.linspace(1, 2, 3), names=["s1", "s2", "s3"])
+        assert len(doc.objects) == 13
+        assert doc.get_object("Cylinder 10").parameters.Placement.Position == [9, 0, 0]
+        assert doc.get_object("s3").parameters.Radius == 2
+        _assert_index_consistent(doc)
+
+    def test_single_update(self):
+        pytest.importorskip("numpy")
+        doc = CadDocument()
+        updates = []
+        _subscription = doc.ydoc.observe(lambda event: updates.append(event))
+        doc.add_boxes(lengths=[1] * 100)
+        assert len(updates) == 1
+        assert len(doc.objects) == 100
+
+    @pytest.mark.parametrize(
+        "kwargs",
+        [
+            {"lengths": [1, -1]},
+            {"lengths": [1, 2], "widths": [1, 2, 3]},
+            {"positions": [[0, 0]]},
+            {"heights": [float("nan")]},
+            {"names": ["a", "a"]},
+            {"names": ["a"], "lengths": [1, 2]},
+            {"colors": ["#FF0000", 3]},
+        ],
+    )
+    def test_validation(self, document, kwargs):
+        pytest.importorskip("numpy")
+        before = document.objects
+        with pytest.raises(ValueError):
+            document.add_boxes(**kwargs)
+        assert document.objects == before
+
+    @pytest.mark.parametrize(
+        "method, kwargs",
+        [
+            ("add_spheres", {"radii": [1, 0]}),
+            ("add_spheres", {"colors": [None, ["#FF0000"]]}),
+            ("add_cylinders", {"angles": [360, -90]}),
+        ],
+    )
+    def test_schema_bounds(self, document, method, kwargs):
+        pytest.importorskip("numpy")
+        before = document.objects
+        with pytest.raises(ValueError):
+            getattr(document, method)(**kwargs)
+        assert document.objects == before
+
+    def test_inside_batch(self, document):
+        pytest.importorskip("numpy")
+        with pytest.raises(RuntimeError):
+            with document.batch():
+                document.add_boxes(lengths=[1, 2, 3])
+                assert len(document.objects) == 6
+                raise RuntimeError("boom")
+        assert document.objects == ["a", "b", "c"]
+        _assert_index_consistent(document)
+
+
+class TestNameGeneration:
+    """Tests for the automatic object names"""
+
+    def test_sequential_names(self):
+        doc = CadDocument()
+        doc.add_box().add_box().add_sphere().add_box()
+        assert doc.objects == ["Box 1", "Box 2", "Sphere 1", "Box 3"]
+
+    def test_seeded_from_imported_names(self, tmp_path):
+        path = tmp_path / "doc.jcad"
+        path.write_text(
+            json.dumps(
+                {
+                    "objects": [
+                        {"name": name, "shape": "Part::Box", "parameters": {}}
+                        for name in ("Box 7", "Box 2", "My Box", "Sphere x")
+                    ]
+                }
+            )
+        )
+        doc = CadDocument.import_from_file(path)
+        doc.add_box().add_sphere()
+        assert doc.objects[-2:] == ["Box 8", "Sphere 1"]
+
+    def test_names_not_reused_after_remove(self):
+        doc = CadDocument()
+        doc.add_box().add_box()
+        doc.remove("Box 2")
+        doc.add_box()
+        assert doc.objects == ["Box 1", "Box 3"]
+
+    def test_remote_inserts_advance_counter(self):
+        doc = CadDocument()
+        doc.add_box()
+        remote = Doc()
+        remote["objects"] = remote_objects = Array()
+        remote.apply_update(doc.ydoc.get_update())
+        remote_objects.append(Map({"name": "Box 5", "shape": "Part::Box"}))
+        doc.ydoc.apply_update(remote.get_update(doc.ydoc.get_state()))
+        doc.add_box()
+        assert doc.objects == ["Box 1", "Box 5", "Box 6"]
+
+    def test_bulk_names_unique(self):
+        pytest.importorskip("numpy")
+        doc = CadDocument()
+        doc.add_box(name="Box 3")
+        doc.add_boxes(lengths=[1, 1, 1])
+        assert doc.objects == ["Box 3", "Box 4", "Box 5", "Box 6"]
+
+
+class TestObjectCache:
+    """Tests for the decoded object cache"""
+
+    def test_repeated_reads_hit(self, document):
+        document.get_object_view("a")
+        document.get_object_view("a")
+        document.get_object("a")
+        info = document.object_cache_info()
+        assert (info.hits, info.misses, info.size) == (2, 1, 1)
+
+    def test_only_changed_entry_dropped(self, document):
+        view_a = document.get_object_view("a")
+        view_b = document.get_object_view("b")
+        document.set_color("a", "#FF0000")
+        assert document.get_object_view("b") is view_b
+        new_view_a = document.get_object_view("a")
+        assert new_view_a is not view_a
+        assert new_view_a.parameters.Color == "#FF0000"
+
+    def test_remove_and_rename_drop_entries(self, document):
+        document.get_object_view("a")
+        document.get_object_view("c")
+        document.remove("a")
+        assert document.get_object_view("a") is None
+        document._get_yobject_by_name("c")["name"] = "d"
+        assert document.get_object_view("c") is None
+        assert document.get_object_view("d").name == "d"
+
+    def test_remote_change_drops_entry(self, document):
+        document.get_object_view("b")
+        remote = Doc()
+        remote["objects"] = remote_objects = Array()
+        remote.apply_update(document.ydoc.get_update())
+        parameters = remote_objects[1]["parameters"]
+        parameters["Length"] = 42
+        remote_objects[1]["parameters"] = parameters
+        document.ydoc.apply_update(remote.get_update(document.ydoc.get_state()))
+        assert document.get_object_view("b").parameters.Length == 42
+
+    def test_changes_inside_batch(self, document):
+        document.get_object_view("a")
+        with document.batch():
+            document.set_color("a", "#FF0000")
+            assert document.get_object_view("a").parameters.Color == "#FF0000"
+        assert document.get_object_view("a").parameters.Color == "#FF0000"
+
+    def test_returned_objects_are_independent(self, document):
+        obj = document.get_object("a")
+        obj.parameters.Length = 100
+        assert document.get_object("a").parameters.Length == 1
+        assert document.get_object_view("a").parameters.Length == 1
+
+
+class TestDependencyGraph:
+    """Tests for the dependency graph between objects"""
+
+    @pytest.fixture
+    def assembly(self, document):
+        # a, b, c -> cut(a, b) -> fuse(cut, c)
+        document.cut(name="cut", base="a", tool="b")
+        document.fuse(name="fuse", shape1="cut", shape2="c")
+        document.add_box(name="lonely")
+        return document
+
+    def test_direct_edges(self, assembly):
+        assert assembly.dependencies("cut") == ["a", "b"]
+        assert assembly.dependencies("a") == []
+        assert assembly.dependents("a") == ["cut"]
+        assert assembly.dependents("c") == ["fuse"]
+        assert assembly._get_yobject_by_name("cut")["dependencies"] == ["a", "b"]
+
+    def test_transitive_edges(self, assembly):
+        assert assembly.dependencies("fuse", transitive=True) == ["a", "b", "c", "cut"]
+        assert assembly.dependents("a", transitive=True) == ["cut", "fuse"]
+
+    def test_topological_order(self, assembly):
+        # Operands placed after the operation in the array
+        assembly._objects_array.insert(
+            0,
+            Map(
+                {
+                    "name": "late_cut",
+                    "shape": "Part::Cut",
+                    "parameters": {"Base": "lonely", "Tool": "fuse"},
+                }
+            ),
+        )
+        order = assembly.topological_order()
+        assert sorted(order) == sorted(assembly.objects)
+        for name in order:
+            for dependency in assembly.dependencies(name):
+                assert order.index(dependency) < order.index(name)
+        assert assembly.topological_order(["cut"]) == ["a", "b", "cut"]
+
+    def test_graph_follows_parameter_changes(self, assembly):
+        cut = assembly._get_yobject_by_name("cut")
+        parameters = cut["parameters"]
+        parameters["Tool"] = "lonely"
+        cut["parameters"] = parameters
+        assert assembly.dependencies("cut") == ["a", "lonely"]
+        assert assembly.dependents("b") == []
+        assert assembly.dependents("lonely") == ["cut"]
+
+    def test_cycle_detection(self, assembly):
+        a = assembly._get_yobject_by_name("a")
+        a["shape"] = "Part::Cut"
+        a["parameters"] = {"Base": "fuse", "Tool": "lonely"}
+        with pytest.raises(ValueError, match="cycle"):
+            assembly.topological_order()
+
+    def test_dangling_references(self, assembly):
+        assert assembly.dangling_references() == {}
+        assembly._pop_yobject(assembly._get_yobject_index_by_name("b"))
+        assert assembly.dangling_references() == {"cut": ["b"]}
+        assert "b" not in assembly.topological_order()
+
+    def test_remove_keeps_dependents(self, assembly, caplog):
+        assembly.remove("a")
+        assert "cut" in assembly.objects
+        assert not assembly.get_object_view("b").visible
+        assert assembly.dangling_references() == {"cut": ["a"]}
+        assert "cut" in caplog.text
+
+    def test_remove_cascades(self, assembly):
+        assembly.remove("cut", cascade=True)
+        assert assembly.objects == ["a", "b", "c", "lonely"]
+        assert assembly.get_object_view("a").visible
+        assert assembly.get_object_view("b").visible
+        assert assembly.dependents("a") == []
+        _assert_index_consistent(assembly)
+
+
+class TestRename:
+    """Tests for in-place renames"""
+
+    @pytest.fixture
+    def assembly(self, document):
+        document.cut(name="cut", base="a", tool="b")
+        document.fuse(name="fuse", shape1="cut", shape2="c")
+        return document
+
+    def test_rename_in_place(self, assembly):
+        position = assembly._get_yobject_index_by_name("cut")
+        data = assembly._get_yobject_by_name("cut").to_py()
+        assembly.rename("cut", "drilled")
+        assert assembly._get_yobject_index_by_name("drilled") == position
+        assert assembly._get_yobject_by_name("drilled").to_py() == {
+            **data,
+            "name": "drilled",
+        }
+        assert assembly.get_object_view("drilled").visible is False
+        _assert_index_consistent(assembly)
+
+    def test_references_rewritten(self, assembly):
+        assembly.rename("a", "base")
+        assembly.rename("cut", "drilled")
+        assert assembly.get_object("drilled").parameters.Base == "base"
+        assert assembly.get_object("fuse").parameters.Shapes == ["drilled", "c"]
+        assert assembly._get_yobject_by_name("fuse")["dependencies"] == ["drilled", "c"]
+        assert assembly.dependents("base") == ["drilled"]
+        assert assembly.dangling_references() == {}
+
+    def test_single_update(self, assembly):
+        updates = []
+        _subscription = assembly.ydoc.observe(lambda event: updates.append(event))
+        assembly.rename("cut", "drilled")
+        assert len(updates) == 1
+
+    def test_annotations_follow(self, assembly):
+        annotation = assembly.add_annotation("cut", "check this")
+        assembly.rename("cut", "drilled")
+        assert json.loads(assembly._metadata[annotation])["parent"] == "drilled"
+
+    def test_cached_views_stay_valid(self, assembly):
+        assembly.get_object_view("cut").parameters
+        fuse_view = assembly.get_object_view("fuse")
+        fuse_view.parameters
+        hits = assembly.object_cache_info().hits
+        assembly.rename("cut", "drilled")
+        assert assembly.get_object_view("drilled").parameters.Base == "a"
+        assert assembly.get_object_view("fuse").parameters.Shapes == ["drilled", "c"]
+        assert assembly.object_cache_info().hits == hits + 2
+
+    def test_rollback_leaves_no_cached_views(self, assembly):
+        assembly.get_object_view("cut").parameters
+        assembly.get_object_view("fuse").parameters
+        with pytest.raises(RuntimeError):
+            with assembly.batch():
+                assembly.rename("cut", "drilled")
+                raise RuntimeError("boom")
+        assert "drilled" not in assembly._object_cache
+        assert assembly.get_object_view("drilled") is None
+        assert assembly.get_object_view("cut").name == "cut"
+        assert assembly.get_object_view("fuse").parameters.Shapes == ["cut", "c"]
+
+    def test_invalid_renames(self, assembly):
+        with pytest.raises(ValueError):
+            assembly.rename("missing", "x")
+        with pytest.raises(ValueError):
+            assembly.rename("a", "b")
+        assert assembly.objects == ["a", "b", "c", "cut", "fuse"]
+
+
+class TestBake:
+    """Tests for collapsing boolean history into BRep objects"""
+
+    @pytest.fixture
+    def assembly(self, document):
+        pytest.importorskip("OCC")
+        document.cut(name="cut", base="a", tool="b")
+        document.fuse(name="fuse", shape1="cut", shape2="c")
+        document.add_box(name="other")
+        return document
+
+    def test_bake_replaces_history(self, assembly):
+        assembly.bake("fuse")
+        assert assembly.objects == ["fuse", "other"]
+        baked = assembly.get_object_view("fuse")
+        assert baked.shape.value == "Part::Any"
+        assert baked.visible
+        assert assembly.dependencies("fuse") == []
+        assert assembly._reconstruct_occ_shape(baked, {}) is not None
+
+    def test_keep_history(self, assembly):
+        before = assembly._objects_array.to_py()
+        assembly.bake("fuse", keep_history=True)
+        assert "history_fuse" in assembly._metadata
+        assembly.restore_history("fuse")
+        assert assembly._objects_array.to_py() == before
+        assert "history_fuse" not in assembly._metadata
+
+    def test_shared_operand_kept(self, assembly):
+        assembly.cut(name="other_cut", base="other", tool="a")
+        assembly.bake("fuse")
+        assert "a" in assembly.objects
+        assert "b" not in assembly.objects
+
+
+class TestStreamingImport:
+    """Tests for the incremental .jcad reader"""
+
+    @pytest.fixture
+    def jcad_file(self, tmp_path):
+        content = {
+            "schemaVersion": "3.0.0",
+            "objects": [
+                {"name": "box", "shape": "Part::Box", "parameters": {"Length": 2}},
+                {
+                    "name": "part",
+                    "shape": "Part::Any",
+                    "parameters": {
+                        "Content": 'ISO-10303-21;\n"é" [{}] \\ ' * 1000,
+                        "Type": "step",
+                    },
+                    "visible": True,
+                },
+            ],
+            "options": {"cameraSettings": {"type": "Perspective"}},
+            "metadata": {"author": "me"},
+            "outputs": {},
+        }
+        path = tmp_path / "doc.jcad"
+        path.write_text(json.dumps(content, indent=4, ensure_ascii=False))
+        return path, content
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+    def test_reader_matches_json_load(self, jcad_file, chunk_size):
+        from jupytercad_lab.notebook.jcad_reader import JcadReader
+
+        path, content = jcad_file
+        decoded = {}
+        with JcadReader(path, chunk_size=chunk_size) as reader:
+            for key in reader.keys():
+                if key == "objects":
+                    decoded[key] = [raw.decode() for raw in reader.iter_array()]
+                else:
+                    decoded[key] = reader.read_value().decode()
+        assert decoded == content
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+    @pytest.mark.parametrize("defer_above", [0, 1 << 20])
+    def test_reader_skips_deferred_strings(self, jcad_file, chunk_size, defer_above):
+        from jupytercad_lab.notebook.jcad_reader import JcadReader, read_value_at
+
+        path, content = jcad_file
+        expected = content["objects"][1]["parameters"]["Content"]
+        buffer_sizes = []
+        with JcadReader(path, chunk_size=chunk_size) as reader:
+            fill = reader._fill
+
+            def tracking_fill():
+                buffer_sizes.append(len(reader._buffer))
+                return fill()
+
+            reader._fill = tracking_fill
+            for key in reader.keys():
+                if key != "objects":
+                    reader.read_value()
+                    continue
+                box, part = reader.iter_array(("parameters", "Content"), defer_above)
+        assert box.deferred is None
+        assert box.decode() == content["objects"][0]
+        if defer_above:
+            assert part.deferred is None
+            assert part.decode() == content["objects"][1]
+        else:
+            assert part.decode()["parameters"] == {"Content": "", "Type": "step"}
+            assert read_value_at(path, *part.deferred) == expected
+            if chunk_size < 1024:
+                # The skipped string was never held in memory.
+                assert max(buffer_sizes) < 1024
+
+    def test_import(self, jcad_file):
+        path, content = jcad_file
+        progress = []
+        doc = CadDocument.import_from_file(
+            path, progress=lambda done, total: progress.append((done, total))
+        )
+        assert doc._objects_array.to_py() == content["objects"]
+        assert doc._options.to_py() == content["options"]
+        assert doc._metadata.to_py() == content["metadata"]
+        assert len(progress) == 3
+        assert progress == sorted(progress)
+        assert progress[-1][0] == progress[-1][1] == path.stat().st_size
+        _assert_index_consistent(doc)
+
+    def test_deferred_content(self, jcad_file, tmp_path):
+        path, content = jcad_file
+        expected = content["objects"][1]["parameters"]["Content"]
+        doc = CadDocument.import_from_file(path, defer_content_above=1024)
+        assert doc._get_yobject_by_name("part")["parameters"]["Content"] == ""
+        assert doc._get_yobject_by_name("box")["parameters"]["Length"] == 2
+        assert doc.get_object_view("part").parameters.Content == expected
+
+        doc.rename("part", "renamed")
+        assert doc.get_object("renamed").parameters.Content == expected
+
+        saved = tmp_path / "saved.jcad"
+        doc.save(saved, extract_features=False)
+        objects = json.loads(saved.read_text())["objects"]
+        assert objects[1]["parameters"]["Content"] == expected
+
+        doc.load_deferred_content()
+        assert doc._get_yobject_by_name("renamed")["parameters"]["Content"] == expected
+        assert not doc._deferred_content
+
+    def test_modified_source(self, jcad_file):
+        import os
+
+        path, _ = jcad_file
+        doc = CadDocument.import_from_file(path, defer_content_above=1024)
+        path.write_text(path.read_text().replace("ISO", "XYZ"))
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        with pytest.raises(RuntimeError, match="modified"):
+            doc.get_object_view("part").parameters
+
+    def test_save_without_deferred_content(self, document, tmp_path, monkeypatch):
+        def no_batch():
+            raise AssertionError("unexpected batch")
+
+        monkeypatch.setattr(document, "batch", no_batch)
+        document.save(tmp_path / "doc.jcad", extract_features=False)
+        assert len(json.loads((tmp_path / "doc.jcad").read_text())["objects"]) == 3
+
+    def test_save_over_source(self, jcad_file):
+        path, content = jcad_file
+        expected = content["objects"][1]["parameters"]["Content"]
+        doc = CadDocument.import_from_file(path, defer_content_above=1024)
+        doc.save(path, extract_features=False)
+        assert doc.get_object_view("part").parameters.Content == expected
+        reloaded = CadDocument.import_from_file(path)
+        assert (
+            reloaded._get_yobject_by_name("part")["parameters"]["Content"] == expected
+        )
+
+
+class TestShapeCache:
+    """Tests for the content-addressed shape cache"""
+
+    @pytest.fixture
+    def assembly(self, document):
+        document.cut(name="cut", base="a", tool="b")
+        return document
+
+    def test_key_ignores_names_and_color(self, assembly):
+        key = assembly._shape_key("cut")
+        assembly.rename("a", "x")
+        assembly.set_color("cut", "#ff0000")
+        assert assembly._shape_key("cut") == key
+
+        other = CadDocument()
+        other.add_box(name="p").add_box(name="q").cut(name="r", base="p", tool="q")
+        assert other._shape_key("r") == key
+
+    def test_key_follows_dependencies(self, assembly):
+        key = assembly._shape_key("cut")
+        parameters = assembly._get_yobject_by_name("b")["parameters"]
+        parameters["Length"] = 3
+        assembly._set_yobject_item(
+            assembly._get_yobject_by_name("b"), "parameters", parameters
+        )
+        assert assembly._shape_key("cut") != key
+
+    def test_key_depends_on_operand_order(self, document):
+        document.cut(name="ab", base="a", tool="c").cut(name="ba", base="c", tool="a")
+        assert document._shape_key("ab") != document._shape_key("ba")
+
+    def test_key_depends_on_engine_options(self, assembly):
+        from jupytercad_lab.notebook.operators import EngineOptions, NaryStrategy
+
+        key = assembly._shape_key("cut")
+        assembly.engine_options = EngineOptions(threads=2, parallel_booleans=True)
+        assert assembly._shape_key("cut") == key
+        assembly.engine_options = EngineOptions(bounding_box_checks=False)
+        assert assembly._shape_key("cut") != key
+        assembly.engine_options = EngineOptions(nary_strategy=NaryStrategy.BALANCED)
+        assert assembly._shape_key("cut") != key
+
+    def _move(self, document, name, position):
+        yobject = document._get_yobject_by_name(name)
+        parameters = yobject["parameters"]
+        parameters["Placement"] = dict(parameters["Placement"], Position=position)
+        document._set_yobject_item(yobject, "parameters", parameters)
+
+    def test_cache_key_ignores_placement(self, assembly):
+        key = assembly._shape_key("a")
+        cut_key = assembly._shape_key("cut")
+        cache_key = assembly._cache_keys["a"]
+        self._move(assembly, "a", [5, 0, 0])
+        assert assembly._shape_key("a") != key
+        assert assembly._shape_key("cut") != cut_key
+        assert assembly._cache_keys["a"] == cache_key
+
+    def test_memory_lru(self):
+        from jupytercad_lab.notebook.shape_cache import ShapeCache
+
+        cache = ShapeCache(max_memory_entries=2)
+        cache.put("k1", "s1")
+        cache.put("k2", "s2")
+        assert cache.get("k1") == "s1"
+        cache.put("k3", "s3")
+        assert "k2" not in cache
+        assert cache.get("k2") is None
+        assert cache.info() == (1, 1, 2)
+
+    def test_disk_eviction(self, tmp_path):
+        import os
+
+        from jupytercad_lab.notebook.shape_cache import ShapeCache
+
+        cache = ShapeCache(tmp_path, max_disk_bytes=250)
+        for age, key in enumerate(["aa1", "bb2", "cc3"]):
+            path = tmp_path / key[:2] / f"{key}.bin"
+            path.parent.mkdir()
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (1000 - age, 1000 - age))
+        cache._evict()
+        assert "aa1" in cache
+        assert "bb2" in cache
+        assert "cc3" not in cache
+
+    def test_reconstruction_uses_cache(self, assembly, tmp_path):
+        pytest.importorskip("OCC")
+        from jupytercad_lab.notebook.shape_cache import ShapeCache
+
+        assembly.shape_cache = ShapeCache(tmp_path)
+        shapes = assembly._get_occ_shapes(["cut"])
+        assert set(shapes) == {"a", "b", "cut"}
+
+        assembly.shape_cache = ShapeCache(tmp_path)
+        shapes = assembly._get_occ_shapes(["cut"])
+        # Operands of a cached object are not rebuilt.
+        assert set(shapes) == {"cut"}
+        assert assembly.shape_cache.info().hits == 1
+
+    def test_moved_object_shares_geometry(self, assembly):
+        pytest.importorskip("OCC")
+        from jupytercad_lab.notebook.shape_cache import ShapeCache
+
+        assembly.shape_cache = ShapeCache()
+        before = assembly._get_occ_shapes(["a"])["a"]
+        self._move(assembly, "a", [5, 0, 0])
+        after = assembly._get_occ_shapes(["a"])["a"]
+        assert after.IsPartner(before)
+        assert not after.IsSame(before)
+        assert assembly.shape_cache.info().hits == 1
+
+
+class TestIncrementalEvaluation:
+    """Tests for dropping only the shapes affected by an edit"""
+
+    @pytest.fixture
+    def evaluated(self, document):
+        document.cut(name="cut", base="a", tool="b")
+        document.fuse(name="fuse", shape1="cut", shape2="c")
+        document.add_box(name="other")
+        document._flush_dirty_shapes()
+        # Stand-ins for the shapes of a previous evaluation.
+        document._evaluated_shapes.update({name: name for name in document.objects})
+        return document
+
+    def _set_parameter(self, document, name, key, value):
+        yobject = document._get_yobject_by_name(name)
+        parameters = yobject["parameters"]
+        parameters[key] = value
+        document._set_yobject_item(yobject, "parameters", parameters)
+
+    def test_edit_dirties_dependents(self, evaluated):
+        self._set_parameter(evaluated, "b", "Length", 3)
+        evaluated._flush_dirty_shapes()
+        assert sorted(evaluated._evaluated_shapes) == ["a", "c", "other"]
+
+    def test_edit_of_unrelated_object(self, evaluated):
+        self._set_parameter(evaluated, "other", "Height", 3)
+        evaluated._flush_dirty_shapes()
+        assert sorted(evaluated._evaluated_shapes) == ["a", "b", "c", "cut", "fuse"]
+
+    def test_edit_keeps_unrelated_keys(self, evaluated, monkeypatch):
+        keys = {name: evaluated._shape_key(name) for name in evaluated.objects}
+        self._set_parameter(evaluated, "b", "Length", 3)
+        hashed = []
+        original = evaluated._get_yobject_by_name
+
+        def tracking(name):
+            hashed.append(name)
+            return original(name)
+
+        monkeypatch.setattr(evaluated, "_get_yobject_by_name", tracking)
+        assert evaluated._shape_key("fuse") != keys["fuse"]
+        assert evaluated._shape_key("other") == keys["other"]
+        assert evaluated._shape_key("a") == keys["a"]
+        assert "a" not in hashed and "other" not in hashed
+
+    def test_remote_edit(self, evaluated):
+        remote = Doc()
+        remote["objects"] = remote_objects = Array()
+        remote.apply_update(evaluated.ydoc.get_update())
+        remote_objects[2]["visible"] = False
+        evaluated.ydoc.apply_update(remote.get_update(evaluated.ydoc.get_state()))
+
+        evaluated._flush_dirty_shapes()
+        assert sorted(evaluated._evaluated_shapes) == ["a", "b", "cut", "other"]
+
+    def test_removal(self, evaluated):
+        evaluated.remove("other")
+        evaluated._flush_dirty_shapes()
+        assert "other" not in evaluated._evaluated_shapes
+        assert "fuse" in evaluated._evaluated_shapes
+
+    def test_only_dirty_branch_is_rebuilt(self, evaluated):
+        pytest.importorskip("OCC")
+        evaluated.shape_cache = None
+        evaluated._evaluated_shapes.clear()
+        first = evaluated._get_occ_shapes(["fuse", "other"])
+
+        self._set_parameter(evaluated, "c", "Radius", 2)
+        second = evaluated._get_occ_shapes(["fuse", "other"])
+        assert second["other"] is first["other"]
+        assert second["cut"] is first["cut"]
+        assert second["fuse"] is not first["fuse"]
+
+
+class TestDeferredRefine:
+    """Tests for refining only the shapes handed out by the document"""
+
+    @pytest.fixture
+    def evaluated(self, document, monkeypatch):
+        from jupytercad_lab.notebook import cad_document
+
+        refined = []
+
+        def fake_refine(shape):
+            refined.append(shape)
+            return f"refined {shape}"
+
+        monkeypatch.setattr(cad_document, "apply_refine", fake_refine)
+        document.shape_cache = None
+        document.cut(name="cut", base="a", tool="b", refine=True)
+        document.fuse(name="fuse", shape1="cut", shape2="c", refine=True)
+        document._flush_dirty_shapes()
+        document._evaluated_shapes.update({name: name for name in document.objects})
+        document.refined = refined
+        return document
+
+    def test_only_requested_shapes_are_refined(self, evaluated):
+        shapes = evaluated._get_occ_shapes(["fuse"], refine=True)
+        assert shapes["fuse"] == "refined fuse"
+        assert evaluated.refined == ["fuse"]
+        # Evaluated shapes, used as operands, stay unrefined.
+        assert evaluated._get_occ_shapes(["fuse"])["fuse"] == "fuse"
+
+    def test_refined_shapes_are_reused(self, evaluated):
+        evaluated._get_occ_shapes(["cut", "fuse"], refine=True)
+        evaluated._get_occ_shapes(["cut", "fuse"], refine=True)
+        assert sorted(evaluated.refined) == ["cut", "fuse"]
+
+    def test_edit_drops_refined_shapes(self, evaluated):
+        evaluated._get_occ_shapes(["cut", "fuse"], refine=True)
+        evaluated.set_color("c", "#ff0000")
+        evaluated._flush_dirty_shapes()
+        assert list(evaluated._refined_shapes) == ["cut"]
+
+
+class TestParallelReconstruction:
+    """Tests for reconstructing independent objects in a process pool"""
+
+    def test_max_workers_validation(self, document):
+        assert document.max_workers == 1
+        with pytest.raises(ValueError):
+            document.max_workers = 0
+
+    def test_matches_sequential(self, document):
+        pytest.importorskip("OCC")
+        from OCC.Core.BRepGProp import brepgprop
+        from OCC.Core.GProp import GProp_GProps
+
+        def volume(shape):
+            props = GProp_GProps()
+            brepgprop.VolumeProperties(shape, props)
+            return props.Mass()
+
+        document.cut(name="cut", base="a", tool="c")
+        document.add_box(name="d").add_sphere(name="e").cut(
+            name="cut2", base="d", tool="e"
+        )
+        document.fuse(name="fuse", shape1="cut", shape2="cut2")
+        document.shape_cache = None
+
+        sequential = document._get_occ_shapes(["fuse"])
+        document._evaluated_shapes.clear()
+        document.max_workers = 2
+        parallel = document._get_occ_shapes(["fuse"])
+        assert set(parallel) == set(sequential)
+        assert volume(parallel["fuse"]) == pytest.approx(volume(sequential["fuse"]))
+
+    def test_worker_failures_rebuilt_locally(self, document, monkeypatch):
+        pytest.importorskip("OCC")
+        from concurrent.futures import Future
+        from concurrent.futures.process import BrokenProcessPool
+
+        from jupytercad_lab.notebook import scheduler
+
+        class BrokenExecutor:
+            def __init__(self, max_workers, mp_context):
+                assert mp_context.get_start_method() == "spawn"
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def submit(self, *args):
+                future = Future()
+                future.set_exception(BrokenProcessPool("worker died"))
+                return future
+
+        monkeypatch.setattr(scheduler, "ProcessPoolExecutor", BrokenExecutor)
+        document.cut(name="cut", base="a", tool="c")
+        document.shape_cache = None
+        document.max_workers = 2
+        shapes = document._get_occ_shapes(["cut"])
+        assert set(shapes) == {"a", "c", "cut"}
+
+    def test_meshing_falls_back_when_pool_breaks(self, document, monkeypatch):
+        pytest.importorskip("OCC")
+        from concurrent.futures.process import BrokenProcessPool
+
+        from jupytercad_lab.notebook import scheduler
+        from jupytercad_lab.notebook.operators import MESH_QUALITIES
+
+        class BrokenExecutor:
+            def __init__(self, max_workers, mp_context):
+                assert mp_context.get_start_method() == "spawn"
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def submit(self, *args):
+                raise BrokenProcessPool("worker died")
+
+        monkeypatch.setattr(scheduler, "ProcessPoolExecutor", BrokenExecutor)
+        document.shape_cache = None
+        shapes = document._get_occ_shapes(["a", "b", "c"])
+        meshed = scheduler.mesh_shapes_in_processes(shapes, MESH_QUALITIES["draft"], 2)
+        assert set(meshed) == {"a", "b", "c"}
+
+    def test_meshing_in_processes(self, document):
+        pytest.importorskip("OCC")
+        from OCC.Core.BRep import BRep_Tool
+        from OCC.Core.TopAbs import TopAbs_FACE
+        from OCC.Core.TopExp import TopExp_Explorer
+        from OCC.Core.TopLoc import TopLoc_Location
+
+        from jupytercad_lab.notebook.operators import MESH_QUALITIES
+
+        document.shape_cache = None
+        document.max_workers = 2
+        shapes = document._get_occ_shapes(["a", "b", "c"])
+        meshed = document._mesh_occ_shapes(shapes, MESH_QUALITIES["draft"])
+        assert set(meshed) == {"a", "b", "c"}
+        for shape in meshed.values():
+            explorer = TopExp_Explorer(shape, TopAbs_FACE)
+            while explorer.More():
+                location = TopLoc_Location()
+                assert BRep_Tool.Triangulation(explorer.Current(), location) is not None
+                explorer.Next()
+
+
+class TestOperators:
+    """Tests for the Python operator registry"""
+
+    def test_parity_with_schema(self):
+        from jupytercad_core.schema import Parts
+        from jupytercad_lab.notebook.operators import has_operator
+
+        missing = [
+            part.value
+            for part in Parts
+            if part is not Parts.Post__Operator and not has_operator(part.value)
+        ]
+        assert missing == []
+
+    def test_uppercase_file_type(self):
+        doc = CadDocument()
+        doc._append_yobject(
+            Map(
+                {
+                    "name": "part",
+                    "shape": "Part::Any",
+                    "parameters": {"Content": "", "Type": "STEP"},
+                }
+            )
+        )
+        assert doc.get_object_view("part").parameters.Type_1.value == "step"
+
+    def test_reconstruct_all_operators(self, document):
+        pytest.importorskip("OCC")
+        from jupytercad_core.schema.interfaces import geomLineSegment
+
+        lines = [
+            geomLineSegment.IGeomLineSegment(
+                TypeId="Part::GeomLineSegment",
+                StartX=start[0],
+                StartY=start[1],
+                StartZ=0,
+                EndX=end[0],
+                EndY=end[1],
+                EndZ=0,
+            ).model_dump()
+            for start, end in [((0, 0), (1, 0)), ((1, 0), (1, 1)), ((1, 1), (0, 0))]
+        ]
+        document.add_sketch(name="sketch", geometry=lines)
+        document.extrude(name="prism", shape="sketch", solid=True)
+        document.chamfer(name="chamfer", shape="a", edge=0, dist=0.1)
+        document.fillet(name="fillet", shape="b", edge=[0, 1], radius=0.1)
+        document.add_torus(name="torus")
+        document.add_occ_shape(document._get_occ_shapes(["c"])["c"], name="brep")
+        document.shape_cache = None
+
+        names = ["sketch", "prism", "chamfer", "fillet", "torus", "brep"]
+        shapes = document._get_occ_shapes(names)
+        assert sorted(shapes) == sorted(names + ["a", "b"])
+
+    @pytest.mark.parametrize("strategy", ["one_pass", "balanced"])
+    def test_nary_booleans(self, strategy):
+        pytest.importorskip("OCC")
+        from OCC.Core.BRepGProp import brepgprop
+        from OCC.Core.GProp import GProp_GProps
+
+        from jupytercad_lab.notebook.operators import EngineOptions, NaryStrategy
+
+        def volume(shape):
+            props = GProp_GProps()
+            brepgprop.VolumeProperties(shape, props)
+            return props.Mass()
+
+        doc = CadDocument()
+        doc.shape_cache = None
+        doc.engine_options = EngineOptions(nary_strategy=NaryStrategy(strategy))
+        names = []
+        for i in range(5):
+            doc.add_box(name=f"box {i}", length=2, position=[i, 0, 0])
+            names.append(f"box {i}")
+        doc.fuse(name="fuse", shape1=names[0], shape2=names[1])
+        fuse = doc._get_yobject_by_name("fuse")
+        doc._set_yobject_item(
+            fuse, "parameters", dict(fuse["parameters"], Shapes=names)
+        )
+        doc.intersect(name="common", shape1=names[0], shape2=names[1])
+        common = doc._get_yobject_by_name("common")
+        doc._set_yobject_item(
+            common, "parameters", dict(common["parameters"], Shapes=names[:2])
+        )
+
+        shapes = doc._get_occ_shapes(["fuse", "common"])
+        assert volume(shapes["fuse"]) == pytest.approx(6)
+        assert volume(shapes["common"]) == pytest.approx(1)
+
+    def test_parallel_engine(self, tmp_path):
+        pytest.importorskip("OCC")
+        from OCC.Core.BRep import BRep_Tool
+        from OCC.Core.TopAbs import TopAbs_FACE
+        from OCC.Core.TopExp import TopExp_Explorer
+        from OCC.Core.TopLoc import TopLoc_Location
+
+        from jupytercad_lab.notebook.operators import EngineOptions, mesh_shape
+
+        doc = CadDocument()
+        doc.shape_cache = None
+        doc.engine_options = EngineOptions(
+            parallel_booleans=True, parallel_meshing=True, threads=2
+        )
+        doc.add_box(name="box").add_sphere(name="sphere", radius=0.5).cut(
+            name="cut", base="box", tool="sphere"
+        )
+        shape = doc._get_occ_shapes(["cut"])["cut"]
+        mesh_shape(shape, 0.01, doc.engine_options)
+        explorer = TopExp_Explorer(shape, TopAbs_FACE)
+        while explorer.More():
+            location = TopLoc_Location()
+            assert BRep_Tool.Triangulation(explorer.Current(), location) is not None
+            explorer.Next()
+
+        doc.export(str(tmp_path / "cut.glb"))
+        assert (tmp_path / "cut.glb").stat().st_size > 0
+
+
+class TestBoundingBoxChecks:
+    """Tests for skipping the booleans of shapes that do not overlap"""
+
+    class Interval:
+        def __init__(self, low, high):
+            self.low, self.high = low, high
+
+        def IsOut(self, other):
+            return self.high < other.low or other.high < self.low
+
+    def test_isolated(self):
+        from jupytercad_lab.notebook.operators import _any_disjoint, _isolated
+
+        boxes = [self.Interval(0, 2), self.Interval(1, 3), self.Interval(5, 6)]
+        assert _isolated(boxes) == [False, False, True]
+        assert _any_disjoint(boxes)
+        assert not _any_disjoint(boxes[:2])
+
+    def test_short_circuits(self):
+        pytest.importorskip("OCC")
+        from OCC.Core.TopAbs import TopAbs_SOLID
+        from OCC.Core.TopExp import TopExp_Explorer
+
+        from jupytercad_lab.notebook.operators import (
+            reset_short_circuit_info,
+            short_circuit_info,
+        )
+
+        def count_solids(shape):
+            explorer = TopExp_Explorer(shape, TopAbs_SOLID)
+            count = 0
+            while explorer.More():
+                count += 1
+                explorer.Next()
+            return count
+
+        doc = CadDocument()
+        doc.shape_cache = None
+        for i, x in enumerate([0, 0.5, 5]):
+            doc.add_box(name=f"box {i}", position=[x, 0, 0])
+        doc.cut(name="cut", base="box 0", tool="box 2")
+        doc.fuse(name="fuse", shape1="box 0", shape2="box 1")
+        fuse = doc._get_yobject_by_name("fuse")
+        doc._set_yobject_item(
+            fuse,
+            "parameters",
+            dict(fuse["parameters"], Shapes=["box 0", "box 1", "box 2"]),
+        )
+        doc.intersect(name="common", shape1="box 0", shape2="box 2")
+
+        reset_short_circuit_info()
+        shapes = doc._get_occ_shapes(["cut", "fuse", "common"])
+        assert shapes["cut"].IsSame(shapes["box 0"])
+        assert count_solids(shapes["fuse"]) == 2
+        assert count_solids(shapes["common"]) == 0
+        assert short_circuit_info() == (1, 1, 1)
+
+
+class TestMeshQuality:
+    """Tests for the size-relative mesh deflection of exports"""
+
+    def test_presets(self, tmp_path):
+        from jupytercad_lab.notebook.operators import (
+            MESH_QUALITIES,
+            MeshQuality,
+            get_mesh_quality,
+        )
+
+        assert get_mesh_quality("fine") is MESH_QUALITIES["fine"]
+        custom = MeshQuality(relative_deflection=0.01, angular_deflection=1)
+        assert get_mesh_quality(custom) is custom
+        with pytest.raises(ValueError, match="draft, normal, fine"):
+            get_mesh_quality("ultra")
+        with pytest.raises(ValueError):
+            CadDocument().export(str(tmp_path / "out.glb"), quality="ultra")
+
+    def test_meshing_leaves_shapes_untouched(self, document):
+        pytest.importorskip("OCC")
+        from OCC.Core.BRep import BRep_Tool
+        from OCC.Core.TopAbs import TopAbs_FACE
+        from OCC.Core.TopExp import TopExp_Explorer
+        from OCC.Core.TopLoc import TopLoc_Location
+
+        from jupytercad_lab.notebook.operators import MESH_QUALITIES
+
+        def triangulated(shape):
+            explorer = TopExp_Explorer(shape, TopAbs_FACE)
+            location = TopLoc_Location()
+            return BRep_Tool.Triangulation(explorer.Current(), location) is not None
+
+        shapes = document._get_occ_shapes(["a", "c"])
+        meshed = document._mesh_occ_shapes(shapes, MESH_QUALITIES["draft"])
+        for name in ("a", "c"):
+            assert triangulated(meshed[name])
+            assert not triangulated(shapes[name])
+            assert not triangulated(document._evaluated_shapes[name])
+
+    def test_deflection_follows_size(self):
+        pytest.importorskip("OCC")
+        from jupytercad_lab.notebook.operators import MESH_QUALITIES, linear_deflection
+
+        doc = CadDocument()
+        doc.shape_cache = None
+        doc.add_box(name="small", length=1, width=1, height=1)
+        doc.add_box(name="large", length=400, width=400, height=400)
+        shapes = doc._get_occ_shapes(["small", "large"])
+        quality = MESH_QUALITIES["normal"]
+        small = linear_deflection(shapes["small"], quality)
+        large = linear_deflection(shapes["large"], quality)
+        assert large == pytest.approx(400 * small, rel=1e-3)
+
+    def test_lods(self, tmp_path):
+        with pytest.raises(ValueError):
+            CadDocument().export(str(tmp_path / "out.glb"), lods=["draft", "ultra"])
+
+        pytest.importorskip("OCC")
+        doc = CadDocument()
+        doc.shape_cache = None
+        doc.add_sphere(name="sphere").add_cylinder(name="cylinder", position=[3, 0, 0])
+        doc.export(str(tmp_path / "model.glb"), lods=["draft", "fine"])
+
+        with open(tmp_path / "model.lods.json") as f:
+            manifest = json.load(f)
+        assert manifest["objects"] == ["sphere", "cylinder"]
+        assert [level["path"] for level in manifest["levels"]] == [
+            "model.lod0.glb",
+            "model.lod1.glb",
+        ]
+        draft, fine = manifest["levels"]
+        assert draft["size"] == (tmp_path / "model.lod0.glb").stat().st_size
+        assert draft["size"] < fine["size"]
+
+
+class TestInstancing:
+    """Tests for sharing the geometry of repeated parts"""
+
+    @pytest.fixture
+    def wheels(self):
+        doc = CadDocument()
+        doc.shape_cache = None
+        for i in range(4):
+            doc.add_cylinder(
+                name=f"wheel {i}", radius=2, height=1, position=[5 * i, 0, 0]
+            )
+        doc.add_cylinder(name="axle", radius=0.5, height=20)
+        return doc
+
+    def test_instance_key_ignores_placement(self, wheels):
+        keys = {name: wheels._instance_key(name) for name in wheels.objects}
+        assert len({keys[f"wheel {i}"] for i in range(4)}) == 1
+        assert keys["axle"] != keys["wheel 0"]
+
+    def test_refined_objects_keep_their_placement(self, document):
+        document.cut(name="cut 0", base="a", tool="b", refine=True)
+        document.cut(name="cut 1", base="a", tool="b", refine=True, position=[5, 0, 0])
+        assert document._instance_key("cut 0") != document._instance_key("cut 1")
+
+    def test_shared_geometry(self, wheels):
+        pytest.importorskip("OCC")
+        shapes = wheels._get_occ_shapes(wheels.objects)
+        assert shapes["wheel 3"].IsPartner(shapes["wheel 0"])
+        assert not shapes["axle"].IsPartner(shapes["wheel 0"])
+
+    def test_export_shares_meshes(self, wheels, tmp_path):
+        pytest.importorskip("OCC")
+        import struct
+
+        path = tmp_path / "wheels.glb"
+        wheels.export(str(path))
+        with open(path, "rb") as f:
+            f.seek(12)
+            length, _ = struct.unpack("<II", f.read(8))
+            gltf = json.loads(f.read(length))
+        assert len(gltf["meshes"]) == 2
+        named = [
+            node for node in gltf["nodes"] if node.get("name", "").startswith("wheel")
+        ]
+        assert len(named) == 4
+
+
+class TestGlbCompression:
+    """Tests for the quantization and reordering of exported GLB files"""
+
+    @pytest.fixture
+    def grid(self, tmp_path):
+        import numpy as np
+
+        from jupytercad_lab.notebook.gltf_compression import write_glb
+
+        n = 20
+        xs, ys = np.meshgrid(np.linspace(0, 10, n), np.linspace(-3, 5, n))
+        positions = np.stack([xs.ravel(), ys.ravel(), np.sin(xs.ravel())], 1).astype(
+            "<f4"
+        )
+        normals = np.tile([0, 0, 1], (n * n, 1)).astype("<f4")
+        triangles = []
+        for i in range(n - 1):
+            for j in range(n - 1):
+                a = i * n + j
+                triangles += [(a, a + 1, a + n), (a + 1, a + n + 1, a + n)]
+        triangles = np.array(triangles)[
+            np.random.default_rng(0).permutation(len(triangles))
+        ]
+        indices = triangles.astype("<u2").ravel()
+
+        binary = positions.tobytes() + normals.tobytes() + indices.tobytes()
+        views = []
+        offset = 0
+        for array in (positions, normals, indices):
+            views.append(
+                {"buffer": 0, "byteOffset": offset, "byteLength": array.nbytes}
+            )
+            offset += array.nbytes
+        gltf = {
+            "asset": {"version": "2.0"},
+            "scene": 0,
+            "scenes": [{"nodes": [0]}],
+            "nodes": [{"mesh": 0, "translation": [1, 2, 3]}],
+            "meshes": [
+                {
+                    "primitives": [
+                        {"attributes": {"POSITION": 0, "NORMAL": 1}, "indices": 2}
+                    ]
+                }
+            ],
+            "buffers": [{"byteLength": len(binary)}],
+            "bufferViews": views,
+            "accessors": [
+                {
+                    "bufferView": 0,
+                    "componentType": 5126,
+                    "count": n * n,
+                    "type": "VEC3",
+                    "min": positions.min(0).tolist(),
+                    "max": positions.max(0).tolist(),
+                },
+                {
+                    "bufferView": 1,
+                    "componentType": 5126,
+                    "count": n * n,
+                    "type": "VEC3",
+                },
+                {
+                    "bufferView": 2,
+                    "componentType": 5123,
+                    "count": indices.size,
+                    "type": "SCALAR",
+                },
+            ],
+        }
+        path = tmp_path / "grid.glb"
+        write_glb(str(path), gltf, binary)
+        return path, positions, triangles
+
+    def _triangles(self, path):
+        import numpy as np
+
+        from jupytercad_lab.notebook.gltf_compression import _Rewriter, read_glb
+
+        gltf, binary = read_glb(str(path))
+        rewriter = _Rewriter(gltf, binary)
+        primitive = gltf["meshes"][0]["primitives"][0]
+        positions = rewriter.read(primitive["attributes"]["POSITION"]).astype(float)
+        child = next(node for node in gltf["nodes"] if "mesh" in node)
+        if (
+            gltf["accessors"][primitive["attributes"]["POSITION"]]["componentType"]
+            == 5122
+        ):
+            positions = positions / 32767 * child["scale"][0] + child["translation"]
+        indices = rewriter.read(primitive["indices"]).reshape(-1, 3)
+        return gltf, sorted(
+            tuple(sorted(tuple(np.round(positions[v], 2)) for v in face))
+            for face in indices
+        )
+
+    def _cache_misses(self, triangles, cache_size=16):
+        cache = []
+        misses = 0
+        for vertex in (v for face in triangles for v in face):
+            if vertex not in cache:
+                misses += 1
+                cache = (cache + [vertex])[-cache_size:]
+        return misses
+
+    def test_round_trip(self, grid):
+        import numpy as np
+
+        from jupytercad_lab.notebook.gltf_compression import compress_glb
+
+        path, positions, triangles = grid
+        size = path.stat().st_size
+        expected = sorted(
+            tuple(sorted(tuple(np.round(positions[v].astype(float), 2)) for v in face))
+            for face in triangles
+        )
+        compress_glb(str(path))
+
+        gltf, found = self._triangles(path)
+        assert found == pytest.approx(expected, abs=1e-2)
+        assert gltf["extensionsRequired"] == ["KHR_mesh_quantization"]
+        # The dequantization is a child of the original node, under its transform.
+        assert gltf["nodes"][0] == {"translation": [1, 2, 3], "children": [1]}
+        assert path.stat().st_size < 0.75 * size
+
+    def test_reorder_only(self, grid):
+        from jupytercad_lab.notebook.gltf_compression import (
+            GlbCompression,
+            _Rewriter,
+            compress_glb,
+            read_glb,
+        )
+
+        path, _, triangles = grid
+        compress_glb(str(path), GlbCompression(quantize=False))
+        gltf, binary = read_glb(str(path))
+        assert "extensionsRequired" not in gltf
+        indices = _Rewriter(gltf, binary).read(
+            gltf["meshes"][0]["primitives"][0]["indices"]
+        )
+        reordered = indices.reshape(-1, 3).tolist()
+        assert (
+            self._cache_misses(reordered) < self._cache_misses(triangles.tolist()) / 2
+        )
+
+    def test_quantized_normals_only(self, grid):
+        from jupytercad_lab.notebook.gltf_compression import (
+            compress_glb,
+            read_glb,
+            write_glb,
+        )
+
+        path, _, _ = grid
+        gltf, binary = read_glb(str(path))
+        # Morph targets keep the positions of the mesh as floats.
+        gltf["meshes"][0]["primitives"][0]["targets"] = [{"POSITION": 0}]
+        write_glb(str(path), gltf, binary)
+
+        compress_glb(str(path))
+        gltf, _ = read_glb(str(path))
+        attributes = gltf["meshes"][0]["primitives"][0]["attributes"]
+        assert gltf["accessors"][attributes["POSITION"]]["componentType"] == 5126
+        assert gltf["accessors"][attributes["NORMAL"]]["componentType"] == 5120
+        assert gltf["extensionsUsed"] == ["KHR_mesh_quantization"]
+        assert gltf["extensionsRequired"] == ["KHR_mesh_quantization"]
+
+    def test_tipsify_is_a_permutation(self):
+        from jupytercad_lab.notebook.gltf_compression import tipsify
+
+        triangles = [(0, 1, 2), (2, 1, 3), (4, 5, 6), (3, 1, 0)]
+        assert sorted(tipsify(triangles, 8, 4)) == [0, 1, 2, 3]
+        assert tipsify([], 0, 4) == []
+
+    def test_export(self, tmp_path):
+        pytest.importorskip("OCC")
+        from jupytercad_lab.notebook.gltf_compression import GlbCompression, read_glb
+
+        doc = CadDocument()
+        doc.shape_cache = None
+        doc.add_sphere(name="sphere")
+        doc.export(str(tmp_path / "plain.glb"))
+        doc.export(str(tmp_path / "compressed.glb"), compression=GlbCompression())
+        gltf, _ = read_glb(str(tmp_path / "compressed.glb"))
+        assert "KHR_mesh_quantization" in gltf["extensionsUsed"]
+        plain = (tmp_path / "plain.glb").stat().st_size
+        assert (tmp_path / "compressed.glb").stat().st_size < plain
@@ -483,6 +483,16 @@ class TestErrorHandling:
         assert results["nonexistent"].extraction_method.value == "error"
         assert len(results["nonexistent"].errors) > 0
 
+    def test_dependency_cycle(self, extractor, mock_document):
+        """A document whose references cannot be ordered is still extracted"""
+        def topological_order(names):
+            raise ValueError("Dependency cycle: a -> b -> a")
+
+        mock_document.topological_order = topological_order
+        results = extractor.extract_all_features(objects=["test_box"])
+
+        assert results["test_box"].extraction_method.value != "error"
+
 
 class TestBRepExtraction:
     """Tests for BRep-based extraction (with mocked OCC)"""